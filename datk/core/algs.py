@@ -18,6 +18,8 @@ class LCR(Synchronous_Algorithm):
         - Every process has state['status'] is 'leader' or 'non-leader'.
         - Exactly one process has state['status'] is 'leader'
     """
+    fields = {'send': object, 'decided': object}
+
     def msgs_i(self, p):
         if not self.has(p, "send"):
             self.set(p, 'send', Message(self, p.UID))
@@ -66,7 +68,7 @@ class AsyncLCR(Asynchronous_Algorithm):
         - Every process has state['status'] is 'leader' or 'non-leader'.
         - Exactly one process has state['status'] is 'leader'
     """
-    class Leader_Declaration(Message): pass
+    class Leader_Declaration(Message): __slots__ = ()
     def msgs_i(self, p, verbose=False):
         if not self.has(p, "sends"):
             self.set(p, "sends",  [Message(self, p.UID)])
@@ -127,6 +129,9 @@ class SynchFloodMax(Synchronous_Algorithm):
         - Alternatively, a process that does not know state["diam"] will use 
         state["n"], the size of the network, as a fallback upper bound on diam.
     """
+    combiner = 'max'
+    fields = {'diam': int, 'send': object}
+
     def msgs_i(self,p):
         if self.r < self.get(p, "diam"):
             if not self.has(p, "send"):
@@ -168,15 +173,24 @@ class SynchHS(Synchronous_Algorithm):
     If the identifier is less than its own, it discards the incoming identifier;
     if it is equal to its own, the Process declares itself the leader.
 
+    Requires:
+        - Every process has named ports 'left' and 'right', as in Bidirectional_Ring
     Effects:
         - Every process has state['status'] is 'leader' or 'non-leader'.
         - Exactly one process has state['status'] is 'leader'
     """
-    class Leader_Declaration(Message): pass
+    class Leader_Declaration(Message): __slots__ = ()
+
+    def run(self, network, params = {}):
+        for p in network:
+            if 'left' not in p.port_names or 'right' not in p.port_names:
+                raise Exception("SynchHS requires every Process to have ports named 'left' and 'right', "
+                                "as in Bidirectional_Ring, but "+str(p)+" has "+str(sorted(p.port_names)))
+        Synchronous_Algorithm.run(self, network, params)
     
     def msgs_i(self, p):
         if "status" in p.state:
-            p.send_msg(SynchHS.Leader_Declaration(self), p.out_nbrs[-1])
+            p.send_msg(SynchHS.Leader_Declaration(self), 'right')
             return p.terminate(self)
 
         # initialize messages if needed
@@ -188,17 +202,17 @@ class SynchHS(Synchronous_Algorithm):
         if not self.has(p, "send-"):
             self.set(p, 'send-', Message(self, minus_msg))
 
-       # send the current value of send+ to process i + 1
+        # send the current value of send+ to process i + 1
         msg = self.get(p, "send+")
         if msg is not None:
             self.set(p, "send+", None)
-            p.send_msg(msg, p.out_nbrs[-1])
+            p.send_msg(msg, 'right')
 
         # send the current value of send- to process i- 1
         msg = self.get(p, "send-")
         if msg is not None:
             self.set(p, "send-", None)
-            p.send_msg(msg, p.out_nbrs[0])
+            p.send_msg(msg, 'left')
 
     def trans_i(self, p, msgs):
         # initialize the phase of process p to phase 0
@@ -214,7 +228,7 @@ class SynchHS(Synchronous_Algorithm):
             val, flag, hopcount = msg.content
 
             # If msg came from process i-1
-            if msg.author == p.out_nbrs[0]:
+            if msg.author == p.nbr('left'):
                 if flag == 'out':
                     if val > p.UID and hopcount > 1:
                         self.set(p, 'send+', Message(self, (val, flag, hopcount-1)))
@@ -229,7 +243,7 @@ class SynchHS(Synchronous_Algorithm):
                         left_msg_returned = True
 
             #If msg came from process i+1
-            if msg.author == p.out_nbrs[1]:
+            if msg.author == p.nbr('right'):
                 if flag == 'out':
                     if val > p.UID and hopcount > 1:
                         self.set(p, 'send-', Message(self, (val, flag, hopcount-1)))
@@ -329,7 +343,7 @@ class SynchVariableSpeeds(Synchronous_Algorithm):
         - Every process has state['status'] is 'leader' or 'non-leader'.
         - Exactly one process has state['status'] is 'leader'
     """
-    class Leader_Declaration(Message): pass
+    class Leader_Declaration(Message): __slots__ = ()
 
     def msgs_i(self, p):
         if 'status' in p.state:
@@ -391,7 +405,10 @@ class SynchBFS(Synchronous_Algorithm):
     """
     class Search(Message):
         """Search for children"""
-        pass
+        __slots__ = ()
+
+    combiner = 'first'
+    fields = {'recently_marked': bool}
     
     def is_i0(self, p): return p.state["status"] == "leader"
 
@@ -439,10 +456,10 @@ class SynchBFSAck(Synchronous_Algorithm):
     """
     class Search(Message):
         """Search for children"""
-        pass
+        __slots__ = ()
     class AckParent(Message):
         """Acknowledge Parent"""
-        pass
+        __slots__ = ()
 
     def is_i0(self, p): return p.state["status"] == "leader"
 
@@ -707,6 +724,9 @@ class SynchLubyMIS(Synchronous_Algorithm):
         - Every process knows state['MIS']. A boolean representing whether it
         is a member of the Maximal Independent Set found by Luby's algorithm.
     """
+    randomized = True
+    fields = {'val': object, 'status': object, 'rem_nbrs': object}
+
     def msgs_i(self, p):
         if self.r == 1:
             self.set(p, 'rem_nbrs', p.out_nbrs[:])
@@ -756,6 +776,8 @@ class SynchBellmanFord(Synchronous_Algorithm):
         shortest path to the process with uid UID, for every other process
         in the network.
     """
+    fields = {'SP': object, 'send': bool}
+
     def msgs_i(self, p):
         if self.r == 1:
             self.set(p, 'SP', p.state['nbr_dist'])
@@ -784,3 +806,235 @@ class SynchBellmanFord(Synchronous_Algorithm):
         if updated_SP != SP:
             self.set(p, 'SP', updated_SP)
             self.set(p, 'send', True)
+
+
+#Array implementations, run by the vectorized engine of Array_Algorithm.
+#Each computes the same outputs, message_count and r as the per-Process version.
+
+class ArrayFloodMax(Array_Algorithm):
+    """SynchFloodMax, as whole-Network array operations
+
+    Every round, each Process takes the maximum of its own maximum UID and
+    those of its in_nbrs. Only the Processes whose maximum changed in the
+    previous round can change that of another, so a round only gathers their
+    out-links. Once a round changes no maximum, the rounds left until diam only
+    resend the same UIDs, so they are skipped.
+
+    Requires:
+        - Every process knows state['n'], the size of the network, which is
+        used as diam, as SynchFloodMax does
+    Effects:
+        - Every process has state['status'] is 'leader' or 'non-leader'.
+    """
+    def setup(self):
+        self.diam = len(self.network)
+        self.UIDs = np.array([p.UID for p in self.network])
+        if self.UIDs.dtype.kind not in 'biuf':
+            self.UIDs = self.UIDs.astype(object)
+        self.max_UIDs = self.UIDs.copy()
+        self.changed = np.arange(len(self.network)) # Processes whose maximum changed last round
+
+    def step(self):
+        if self.r < self.diam and not len(self.changed):
+            self.count_msg(len(self.out_indices)*(self.diam - self.r))
+            self.r = self.diam
+        if self.r < self.diam:
+            self.count_msg(len(self.out_indices)) # Every Process sends on every out-link
+            links = self.out_links(self.changed)
+            receivers = self.out_indices[links]
+            before = self.max_UIDs[receivers]
+            np.maximum.at(self.max_UIDs, receivers, self.max_UIDs[self.link_senders[links]])
+            self.changed = np.unique(receivers[self.max_UIDs[receivers] != before])
+        else:
+            self.active[:] = False
+
+    def finish(self):
+        for p, leader in zip(self.network, self.max_UIDs == self.UIDs):
+            self.output(p, "status", "leader" if leader else "non-leader")
+
+
+class ArrayBFS(Array_Algorithm):
+    """SynchBFS, as whole-Network array operations
+
+    A round only gathers the out-links of the Processes that search in it.
+    Each Process chooses as its parent the Process on its lowest in-port among
+    those that search it first, as SynchBFS does.
+
+    Requires:
+        - assertLeaderElection
+        - Every Process is reachable from the leader. Otherwise SynchBFS never
+        halts, and ArrayBFS raises an Exception.
+    Effects:
+        - every Process has state['parent']. Leader has state['parent'] = None
+    """
+    def setup(self):
+        n = len(self.network)
+        self.roots = np.array([p.state.get('status') == 'leader' for p in self.network], dtype=bool)
+        self.roots &= self.active
+        self.has_parent = np.array(['parent' in p.state for p in self.network], dtype=bool)
+        self.parents = np.empty(n, dtype=int)
+        self.parents.fill(-1)
+        self.marked = np.array([], dtype=int) # Processes that are recently_marked
+        self.in_ports = np.fromiter((port for p in self.network for port in p.remote_ports),
+                                    dtype=int, count=len(self.out_indices))
+
+    def step(self):
+        searching = halting = self.marked
+        if self.r == 1:
+            searching = np.flatnonzero(self.roots)
+            self.has_parent[searching] = True
+            halting = np.flatnonzero(self.active & self.has_parent)
+        if not len(searching) and not len(halting):
+            raise Exception("ArrayBFS cannot reach every Process from the leader")
+        self.send(searching)
+
+        links = self.out_links(searching)
+        receivers = self.out_indices[links]
+        order = np.lexsort((self.in_ports[links], receivers))
+        receivers, first = np.unique(receivers[order], return_index=True)
+        senders = self.link_senders[links[order[first]]]
+        marking = self.active[receivers] & ~self.has_parent[receivers]
+        self.marked = receivers[marking]
+        self.parents[self.marked] = senders[marking]
+        self.has_parent[self.marked] = True
+        self.active[halting] = False
+
+    def finish(self):
+        for i in np.flatnonzero(self.roots):
+            self.output(self.network[i], "parent", None)
+        for i in np.flatnonzero(self.parents >= 0):
+            self.output(self.network[i], "parent", self.network[self.parents[i]])
+
+    def get_draw_args(self,network):
+        algorithm_type = "BFS"
+        return Colorizer(self,network,algorithm_type)
+
+
+class ArrayLubyMIS(Array_Algorithm):
+    """SynchLubyMIS, as whole-Network array operations
+
+    The vals of a stage are drawn from random, in the same order as
+    SynchLubyMIS draws them, so that under the same seed both find the same
+    Maximal Independent Set. They are then replaced by their ranks, which
+    compare the same way and fit in an integer array for any n.
+
+    Requires:
+        - Every process knows state['n'], the size of the network
+        - Every link is bidirectional
+    Effect:
+        - Every process knows state['MIS']. A boolean representing whether it
+        is a member of the Maximal Independent Set found by Luby's algorithm.
+    """
+    randomized = True
+
+    def setup(self):
+        n = len(self.network)
+        self.max_val = n**4
+        self.winners = np.zeros(n, dtype=bool)
+        self.losers = np.zeros(n, dtype=bool)
+        self.MIS = np.zeros(n, dtype=bool)
+        self.decided = np.zeros(n, dtype=bool)
+
+    def send_to_remaining(self, senders):
+        """Counts the Messages senders send to their rem_nbrs, the out_nbrs
+        that have not halted"""
+        links = senders[self.link_senders] & self.active[self.out_indices]
+        self.count_msg(int(np.count_nonzero(links)))
+
+    def step(self):
+        if self.r%3 == 1:
+            indices = np.flatnonzero(self.active)
+            vals = np.array([random.randint(0, self.max_val) for i in indices], dtype=object)
+            ranks = np.empty(len(self.network), dtype=int)
+            ranks.fill(-1)
+            if len(indices):
+                ranks[indices] = np.unique(vals, return_inverse=True)[1]
+            self.send_to_remaining(self.active)
+            self.winners = self.active & (self.gather(np.maximum, ranks, -1) < ranks)
+            self.MIS |= self.winners
+            self.decided |= self.winners
+        if self.r%3 == 2:
+            self.send_to_remaining(self.winners)
+            self.losers = self.active & self.gather(np.logical_or, self.winners, False)
+            self.decided |= self.losers
+        if self.r%3 == 0:
+            self.send_to_remaining(self.losers)
+            self.active &= ~(self.winners | self.losers)
+
+    def finish(self):
+        for i in np.flatnonzero(self.decided):
+            self.output(self.network[i], 'MIS', bool(self.MIS[i]))
+
+
+class ArrayBellmanFord(Array_Algorithm):
+    """SynchBellmanFord, as whole-Network array operations
+
+    The SP of all Processes are kept as an n,n matrix of distances, and a mask
+    of the distances that are known. As in SynchBellmanFord, a Process relaxes
+    its SP through the SP of each in_nbr that sent it, in in-port order, and a
+    later in_nbr overrides the update of an earlier one. Once no Process
+    sends, the rounds left until n are skipped.
+
+    Requires:
+        - Every process knows state['nbr_dist'][UID], the weight of the edge
+        form the process to the neighboring process with uid UID, for all
+        neighbors.
+    Effect:
+        - Every process knows state['SP'][UID], the weight of the
+        shortest path to the process with uid UID, for every other process
+        in the network.
+    """
+    def setup(self):
+        n = len(self.network)
+        self.n = n
+        self.UIDs = [p.UID for p in self.network]
+        index = {UID: i for i, UID in enumerate(self.UIDs)}
+        rows, cols, weights = [], [], []
+        for i, p in enumerate(self.network):
+            for UID, weight in p.state['nbr_dist'].iteritems():
+                rows.append(i)
+                cols.append(index[UID])
+                weights.append(weight)
+        weights = np.array(weights)
+        self.dist = np.zeros((n, n), dtype=weights.dtype if len(weights) else int)
+        self.known = np.zeros((n, n), dtype=bool)
+        self.dist[rows, cols] = weights
+        self.known[rows, cols] = True
+        self.sending = self.active.copy()
+
+    def step(self):
+        if self.r < self.n and not self.sending.any():
+            self.r = self.n
+        self.send(self.sending)
+        if self.r == self.n:
+            self.active[:] = False
+        else:
+            self.relax()
+
+    def relax(self):
+        """Relaxes the SP of every Process through those it received"""
+        dist, known = self.dist.copy(), self.known.copy()
+        updated = np.zeros(self.n, dtype=bool)
+        in_degrees = np.diff(self.in_indptr)
+        for k in xrange(in_degrees.max() if self.n else 0):
+            # The Messages on in-port k of every Process
+            receivers = np.flatnonzero(in_degrees > k)
+            senders = self.in_indices[self.in_indptr[receivers] + k]
+            sent = self.sending[senders]
+            receivers, senders = receivers[sent], senders[sent]
+
+            via = self.dist[receivers, senders][:, None] + self.dist[senders]
+            better = self.known[senders] & (~self.known[receivers] | (via < self.dist[receivers]))
+            better[np.arange(len(receivers)), receivers] = False
+            rows = dist[receivers]
+            rows[better] = via[better]
+            dist[receivers] = rows
+            known[receivers] |= better
+            updated[receivers] |= better.any(axis=1)
+        self.dist, self.known, self.sending = dist, known, updated
+
+    def finish(self):
+        for p, dist, known in zip(self.network, self.dist, self.known):
+            cols = np.flatnonzero(known)
+            SP = dict(zip([self.UIDs[j] for j in cols], dist[cols].tolist()))
+            self.output(p, 'SP', SP)
@@ -1,69 +1,411 @@
+import hashlib
+import inspect
+import json
+import os
+import random
+import traceback
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, Process, Pipe, cpu_count
+from timeit import default_timer as clock
+import numpy as np
 from distalgs import Algorithm, Synchronous_Algorithm
 
 import matplotlib.pyplot as plt
 
-def sample(Algorithm_, Network_, test):
+class Running_Stats:
+    """
+    The running mean and variance of a sequence of values, updated one value
+    at a time with Welford's algorithm.
+    """
+    Z = 1.96 # For a 95% confidence interval
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0. # Sum of squared differences from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta/self.count
+        self._m2 += delta*(value - self.mean)
+
+    def variance(self):
+        """@return: the sample variance of the values"""
+        if self.count < 2:
+            return float('inf')
+        return self._m2/(self.count-1)
+
+    def half_width(self):
+        """@return: the half-width of the confidence interval of the mean"""
+        return Running_Stats.Z*(self.variance()/self.count)**0.5
+
+    def converged(self, rel_error):
+        """@return: True iff the confidence interval of the mean is within
+        rel_error of the mean"""
+        return self.half_width() <= rel_error*abs(self.mean)
+
+def geometric_sizes(start=2, stop=500, ratio=2):
+    """@return: the list of sizes start, start*ratio, start*ratio^2, ... below stop"""
+    sizes = []
+    n = start
+    while n < stop:
+        sizes.append(int(n))
+        n *= ratio
+    return sizes
+
+def linear_sizes(start, stop, step=1):
+    """@return: the list of sizes start, start+step, start+2*step, ... below stop"""
+    return range(start, stop, step)
+
+class Result_Cache:
+    """
+    The results of the trials of sample, stored on disk so that a sweep can be
+    resumed, or plotted again, without rerunning them.
+
+    The results for an Algorithm and a Network class are appended, one JSON
+    line per trial, to a file in directory named after both classes and a hash
+    of the source of the Algorithm, so editing the Algorithm starts a new
+    file. Trials are keyed by n and their seed. Censored trials are not stored.
+    """
+    def __init__(self, directory, Algorithm_, Network_):
+        """
+        @param directory: the directory of the cache files, created if needed
+        @param Algorithm_: the Algorithm class whose results to store
+        @param Network_: the Network class whose results to store
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.Algorithm_ = Algorithm_
+        name = "%s-%s-%s.jsonl" % (Algorithm_.__name__, Network_.__name__,
+                                   _source_hash(Algorithm_)[:12])
+        self.path = os.path.join(directory, name)
+        self._results = {} # (n, seed) : (passed, message_count, r, deterministic, None)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except ValueError:
+                        continue # A line cut short by a crash
+                    self._results[(trial['n'], trial['seed'])] = (trial['passed'],
+                        trial['message_count'], trial['r'], trial['deterministic'], None)
+
+    def get(self, n, seed):
+        """@return: the result of the trial of size n with seed, or None"""
+        return self._results.get((n, seed))
+
+    def put(self, n, seed, result):
+        """Stores the result of the trial of size n with seed"""
+        passed, message_count, r, deterministic, reason = result
+        if reason is not None:
+            return
+        self._results[(n, seed)] = result
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'n': n, 'seed': seed, 'passed': passed,
+                'message_count': message_count, 'r': r, 'deterministic': deterministic})+'\n')
+
+    def samples(self):
+        """@return: (size, comm, time) of every stored trial that passed, as
+        returned by sample"""
+        size, comm, time = [], [], []
+        for (n, seed), (passed, message_count, r, _, _) in sorted(self._results.iteritems()):
+            if passed:
+                size.append(n)
+                comm.append(message_count)
+                if issubclass(self.Algorithm_, Synchronous_Algorithm):
+                    time.append(r)
+        return size, comm, time
+
+    def __len__(self):
+        return len(self._results)
+
+def _source_hash(Algorithm_):
+    """@return: a hash of the source of Algorithm_, or of its module if its
+    source cannot be found, e.g. for a class built by a function"""
+    try:
+        source = inspect.getsource(Algorithm_)
+    except (IOError, TypeError):
+        source = inspect.getsource(inspect.getmodule(Algorithm_))
+    return hashlib.sha1(source).hexdigest()
+
+def sample(Algorithm_, Network_, test, workers=1, seed=None,
+           min_trials=3, max_trials=32, rel_error=0.05, sizes=None,
+           max_complexity=10000, budget=None, trial_timeout=None,
+           trial_memory=None, censored=None, cache=None):
     """
     Runs the Algorithm on Networks of the given type, varying n.
     After every execution, runs test on the resultant Network_.
 
+    The number of trials for each n adapts to the variance of the time and
+    communication complexities. Trials stop once the 95% confidence intervals
+    of their means are within rel_error of the means, or after max_trials.
+    A trial that never uses random or numpy.random is deterministic, so it is
+    run just once, unless Algorithm_.randomized. Random numbers drawn from any
+    other source, such as a random.Random instance of the Algorithm's own,
+    can't be detected, so an Algorithm that uses one must declare
+    randomized = True, or it is sampled as if it were deterministic.
+
+    A trial that exceeds trial_timeout or trial_memory is killed and censored:
+    it is left out of the samples and recorded in censored. The first censored
+    trial of some n ends the sampling of that n, since the trials after it
+    would most likely exceed the limits too. If no trial of n completed, larger
+    n are not sampled either.
+
     @param Algorithm_: a subclass of Synchronous_Algorithm, the algorithm to test.
     @param Network_: a subclass of Network, the network on which to benchmark the algorithm.
     @param test: a function that may throw an assertion error 
+    @param workers: [Optional] the number of processes to run trials in. Defaults
+    to 1, which runs them in this process. None uses every CPU. With more than
+    one worker, or with trial limits, test must be picklable, e.g. a
+    module-level function.
+    @param seed: [Optional] seeds the RNGs of the trials. Every trial gets its own
+    seed, derived from seed, n and its number, so results are reproducible for
+    any workers.
+    @param min_trials: [Optional] the fewest trials of a randomized algorithm for each n
+    @param max_trials: [Optional] the most trials for each n
+    @param rel_error: [Optional] the relative half-width of the confidence
+    intervals at which to stop
+    @param sizes: [Optional] the values of n to sample, in order, e.g.
+    geometric_sizes(), linear_sizes(10, 100, 10) or an explicit list.
+    Defaults to geometric_sizes(2, 500).
+    @param max_complexity: [Optional] stops before the next n once a time or
+    communication complexity reaches max_complexity. None for no limit.
+    @param budget: [Optional] the total wall-clock time, in seconds, to spend.
+    No trial is started once it runs out.
+    @param trial_timeout: [Optional] the wall-clock time, in seconds, after
+    which a trial is killed
+    @param trial_memory: [Optional] the most address space, in bytes, that the
+    process of a trial may use (Unix only). It includes the interpreter and
+    the libraries it imported.
+    @param censored: [Optional] a list, to which (n, reason) is appended for
+    every censored trial. reason is 'time', 'memory' or 'killed'.
+    @param cache: [Optional] a directory in which to store the result of every
+    trial, with a Result_Cache. Trials already stored there are not run again,
+    so an interrupted sweep resumes where it stopped. With a cache, seed
+    defaults to 0, so that the trials of a rerun are the same.
     @return: (size, time, comm) where size is a list of values of network size,
     and time and comm are lists of corresponding values of time and communication complexities.
     """
     size = []
     time = []
     comm = []
-    n, lgn = 2, 1
     max_time = 0
     max_comm = 0
-    print "Sampling n = ...",
-    while max(max_time, max_comm) < 10000 and n < 500:
-
-        #Progress
-        if n == 2:
-            print "\b\b\b\b"+str(n)+"...",
-        else:
-            print "\b\b\b\b, "+str(n)+"...",
-
-        cur_times = []
-        cur_comms = []
-        for i in xrange( max(4, 2+lgn) ):
-            A = Algorithm_(params={'draw': False, 'verbosity': Algorithm.SILENT})
-            x = Network_(n)
-            A(x)
-            try:
-                test(x)
-            except AssertionError, e:
-                print "Algorithm Failed"
-                return None
+    if sizes is None:
+        sizes = geometric_sizes(2, 500)
+    if censored is None:
+        censored = []
+    deadline = None if budget is None else clock() + budget
+    if cache is not None:
+        cache = Result_Cache(cache, Algorithm_, Network_)
+        if seed is None:
+            seed = 0
+    base_seed = random.Random(seed).getrandbits(32)
+    if workers is None:
+        workers = cpu_count()
+    limited = trial_timeout is not None or trial_memory is not None
+    pool = Pool(workers) if workers > 1 and not limited else None
+    state = random.getstate(), np.random.get_state()
+    try:
+        print "Sampling n = ...",
+        for n in sizes:
+            if max_complexity is not None and max(max_time, max_comm) >= max_complexity:
+                break
+            if deadline is not None and clock() >= deadline:
+                print "\b\b\b\b (out of time)",
+                break
+
+            #Progress
+            if not size and not censored:
+                print "\b\b\b\b"+str(n)+"...",
             else:
-                size.append(n)
-                cur_comms.append(A.message_count)
-                comm.append(A.message_count)
-
-                if issubclass(Algorithm_, Synchronous_Algorithm):
-                    cur_times.append(A.r)
-                    time.append(A.r)
-                    max_time = max(max_time, A.r)
-                max_comm = max(max_comm, A.message_count)
-
-        #TODO here, decide whether need more samples for this n, based on cur_times and cur_comms variance
-        n*=2
-        lgn += 1
-    print " DONE"
-    return size, comm, time
-
-def benchmark(Algorithm_, Network_, test):
+                print "\b\b\b\b, "+str(n)+"...",
+
+            times = Running_Stats()
+            comms = Running_Stats()
+            trial_count = 0
+            done = False
+            while not done and (deadline is None or clock() < deadline):
+                # A batch of trials, one per worker. Results past the stopping
+                # point are dropped, so the samples do not depend on workers.
+                trials = [(Algorithm_, Network_, test, n, _trial_seed(base_seed, n, i))
+                          for i in xrange(trial_count, min(trial_count+workers, max_trials))]
+                if limited:
+                    run = lambda trials: _limited_trials(trials, workers, trial_timeout, trial_memory)
+                elif pool:
+                    run = lambda trials: pool.imap(_trial, trials)
+                else:
+                    run = lambda trials: (_trial(t) for t in trials)
+                results = _cached_trials(trials, run, cache) if cache is not None else run(trials)
+                for passed, message_count, r, deterministic, reason in results: # In trial order
+                    trial_count += 1
+                    if reason is not None:
+                        censored.append((n, reason))
+                    elif not passed:
+                        print "Algorithm Failed"
+                        return None
+                    else:
+                        size.append(n)
+                        comm.append(message_count)
+                        comms.add(message_count)
+                        max_comm = max(max_comm, message_count)
+
+                        if issubclass(Algorithm_, Synchronous_Algorithm):
+                            time.append(r)
+                            times.add(r)
+                            max_time = max(max_time, r)
+
+                    done = reason is not None or deterministic or trial_count >= max_trials or (
+                        comms.count >= min_trials and comms.converged(rel_error) and
+                        (times.count == 0 or times.converged(rel_error)))
+                    if done:
+                        break
+                if hasattr(results, 'close'):
+                    results.close() # Kills the trials past the stopping point
+
+            if trial_count > 0 and comms.count == 0:
+                print "\b\b\b\b (censored)",
+                break
+        print " DONE"
+        return size, comm, time
+    finally:
+        if pool:
+            pool.terminate()
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+
+def _cached_trials(trials, run, cache):
+    """
+    @param run: a function that runs a list of trials and returns an iterator
+    of their results, in trial order
+    @return: a generator of the results of trials, in trial order. Those in
+    cache are read from it, the others are run and stored in it.
+    """
+    cached = [cache.get(trial[3], trial[4]) for trial in trials]
+    results = run([trial for trial, result in zip(trials, cached) if result is None])
+    try:
+        for trial, result in zip(trials, cached):
+            if result is None:
+                result = next(results)
+                cache.put(trial[3], trial[4], result)
+            yield result
+    finally:
+        if hasattr(results, 'close'):
+            results.close()
+
+def _trial_seed(base_seed, n, i):
+    """@return: the seed of trial i for size n"""
+    return random.Random((base_seed*1000003 + n)*1000003 + i).getrandbits(32)
+
+def _rng_state():
+    """@return: the state of random and numpy.random, comparable with =="""
+    np_state = np.random.get_state()
+    return random.getstate(), np_state[1].tostring(), np_state[2:]
+
+def _trial(trial):
+    """
+    Runs one trial of sample, with its own seed
+
+    @param trial: (Algorithm_, Network_, test, n, seed)
+    @return: (passed, message_count, r, deterministic), whether test passed,
+    the communication and time complexities, and whether the trial used no
+    random numbers: its Algorithm is not randomized, and it left the states
+    of random and numpy.random as they were seeded
+    """
+    Algorithm_, Network_, test, n, seed = trial
+    random.seed(seed)
+    np.random.seed(seed)
+    rng_state = _rng_state()
+    A = Algorithm_(params={'draw': False, 'verbosity': Algorithm.SILENT, 'snapshots': False})
+    x = Network_(n)
+    A(x)
+    deterministic = not A.randomized and _rng_state() == rng_state
+    try:
+        test(x)
+    except AssertionError, e:
+        return False, A.message_count, getattr(A, 'r', None), deterministic, None
+    return True, A.message_count, getattr(A, 'r', None), deterministic, None
+
+def _censored(reason):
+    """@return: the result of a trial that was censored for reason"""
+    return None, None, None, False, reason
+
+def _limited_trials(trials, workers, timeout, memory):
+    """
+    Runs each trial in its own process, at most workers at a time, and kills
+    it if it takes longer than timeout seconds, or censors it if it runs out
+    of memory bytes of address space.
+
+    @return: a generator of the results of the trials, in trial order.
+    Closing it kills the trials that are still running.
+    """
+    def start(trial):
+        receiver, sender = Pipe(duplex=False)
+        process = Process(target=_limited_trial, args=(trial, memory, sender))
+        process.daemon = True
+        process.start()
+        sender.close()
+        return process, receiver, clock()
+
+    trials = iter(trials)
+    running = deque(start(trial) for trial in islice(trials, workers))
+    try:
+        while running:
+            process, receiver, started = running.popleft()
+            wait = None if timeout is None else max(0, started + timeout - clock())
+            if receiver.poll(wait):
+                try:
+                    result, error = receiver.recv()
+                except EOFError: # The process died without a result
+                    result, error = _censored('killed'), None
+            else:
+                result, error = _censored('time'), None
+            process.terminate()
+            process.join()
+            if error is not None:
+                raise Exception("A trial raised an exception:\n"+error)
+
+            for trial in islice(trials, 1):
+                running.append(start(trial))
+            yield result
+    finally:
+        for process, receiver, started in running:
+            process.terminate()
+            process.join()
+
+def _limited_trial(trial, memory, sender):
+    """Runs trial in this process, with at most memory bytes of address
+    space, and sends (result, traceback of an exception or None) to sender"""
+    if memory is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    try:
+        sender.send((_trial(trial), None))
+    except MemoryError:
+        sender.send((_censored('memory'), None))
+    except Exception:
+        sender.send((None, traceback.format_exc()))
+
+def benchmark(Algorithm_, Network_, test, workers=1, seed=None, cache=None,
+              cached_only=False, **kwargs):
     """
     Benchmarks the Algorithm on a given class of Networks. Samples variable network size, and plots results.
 
     @param Algorithm_: a subclass of Synchronous_Algorithm, the algorithm to test.
     @param Network_: a subclass of Network, the network on which to benchmark the algorithm.
     @param test: a function that may throw an assertion error 
+    @param workers: [Optional] the number of processes to run trials in, as in sample
+    @param seed: [Optional] seeds the RNGs of the trials, as in sample
+    @param cache: [Optional] a directory to store the results of trials in,
+    and to resume from, as in sample
+    @param cached_only: [Optional] if True, plots the results stored in cache
+    without running any trials. Requires cache.
+    @param kwargs: [Optional] the sizes, budget, trial limits and stopping
+    criteria of sample
     """                     
+    assert cache is not None or not cached_only, "cached_only requires a cache"
 
     def averages(x,y):
         """
@@ -109,8 +451,11 @@ def benchmark(Algorithm_, Network_, test):
         ax.set_title(title)
         ax.set_xlabel(Network_.__name__ +' size')
 
-    data = sample(Algorithm_, Network_, test)
-    if data is None: return
+    if cached_only:
+        data = Result_Cache(cache, Algorithm_, Network_).samples()
+    else:
+        data = sample(Algorithm_, Network_, test, workers, seed, cache=cache, **kwargs)
+    if data is None or not data[0]: return
     size, comm, time = data
     
     if issubclass(Algorithm_, Synchronous_Algorithm):
@@ -1,3 +1,6 @@
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum, unique
 
 @unique
@@ -34,11 +37,12 @@ def Colorizer(algorithm, network, algorithm_type):
     if algorithm_type == "leader_election":
         node_colors = {}
         edge_colors = None
-        for p in network.processes:
-            if p.state['status'] == "leader":
+        status = network.column('status')
+        leaders, non_leaders = status == "leader", status == "non-leader"
+        for p, leader, non_leader in zip(network.processes, leaders, non_leaders):
+            if leader:
                 node_colors[p.UID] = Color.red
-
-            elif p.state['status'] == "non-leader": # non-leader
+            elif non_leader:
                 node_colors[p.UID] = Color.blue
             else:
                 node_colors[p.UID] = Color.yellow
@@ -48,10 +52,129 @@ def Colorizer(algorithm, network, algorithm_type):
     elif algorithm_type == "BFS":
         node_colors = None
         edge_colors = dict()
-        for p in network.processes:
-            if p.state['parent']:
-                parent_UID = p.state['parent'].UID
-
-                edge_colors[(p.UID,parent_UID)] = Color.green
+        for p, parent in zip(network.processes, network.column('parent')):
+            if parent:
+                edge_colors[(p.UID,parent.UID)] = Color.green
 
         return node_colors, edge_colors
+
+
+class Color_Cache(object):
+    """
+    A bounded LRU cache of the colors of the snapshots of a Network, as given
+    by network.get_colors(t).
+
+    A background thread fills it with the snapshots around the one requested
+    last, nearest first, so that a simulator can move between nearby
+    snapshots without rerunning the Colorizers on its UI thread.
+    """
+    def __init__(self, network, capacity=256, radius=32):
+        """
+        @param network: the Network whose snapshots to color
+        @param capacity: [Optional] the most snapshots to keep colors of
+        @param radius: [Optional] the number of snapshots on each side of the
+        one requested last to prefetch
+        """
+        assert capacity > 2*radius, "The cache must hold all the snapshots it prefetches"
+        self.network = network
+        self.capacity = capacity
+        self.radius = radius
+
+        self._colors = OrderedDict() # t : (node_colors, edge_colors), least recently used first
+        self._center = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._compute_lock = threading.Lock() # Snapshots are rebuilt one at a time
+
+        self._thread = threading.Thread(target=self._prefetch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get(self, t):
+        """
+        @return: network.get_colors(t), from the cache if it is there. Also
+        moves the prefetched window to be around t.
+        """
+        if t < 0:
+            t += len(self.network._snapshots)
+        with self._lock:
+            colors = self._colors.pop(t, None)
+            if colors is not None:
+                self._colors[t] = colors
+            self._center = t
+            self._changed.notify_all()
+        if colors is None:
+            colors = self._compute(t)
+            self._store(t, colors)
+        return colors
+
+    def wait(self, timeout=None):
+        """
+        Blocks until every snapshot within self.radius of the one requested
+        last is cached, or until the cache is closed.
+
+        @param timeout: [Optional] the most seconds to wait, or None to wait
+        for as long as it takes
+        @return: True iff the prefetched window is cached
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._next_missing() is not None and not self._closed:
+                if deadline is None:
+                    self._changed.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+            return self._next_missing() is None
+
+    def close(self):
+        """Stops the prefetching thread, and waits for it to finish"""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __contains__(self, t):
+        with self._lock:
+            return t in self._colors
+
+    def __len__(self):
+        with self._lock:
+            return len(self._colors)
+
+    def _compute(self, t):
+        with self._compute_lock:
+            return self.network.get_colors(t)
+
+    def _store(self, t, colors):
+        with self._lock:
+            self._colors.pop(t, None)
+            self._colors[t] = colors
+            while len(self._colors) > self.capacity:
+                self._colors.popitem(last=False)
+            self._changed.notify_all()
+
+    def _next_missing(self):
+        """@return: the snapshot nearest self._center that is not cached, within
+        self.radius of it, or None. Must be called with self._lock held."""
+        count = len(self.network._snapshots)
+        for d in xrange(self.radius+1):
+            for t in (self._center+d, self._center-d):
+                if 0 <= t < count and t not in self._colors:
+                    return t
+
+    def _prefetch(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    t = self._next_missing()
+                    if t is not None:
+                        break
+                    self._changed.wait()
+                else:
+                    return
+            self._store(t, self._compute(t))
@@ -0,0 +1,160 @@
+"""
+Columnar state store
+
+The fields an Algorithm declares are stored by column rather than in the state
+dicts of its Processes: each field has an entry for every Process, ordered by
+index. A whole field can then be read at once, and nothing is allocated per
+Process.
+
+Fields with a numeric or boolean dtype are numpy arrays, with a mask of the
+entries that are set. Fields of dtype object are Python lists, which are
+faster than object arrays to read and write one entry at a time, as
+Algorithm.get and Algorithm.set do.
+
+Fields that are not declared, and the public state of the Processes, stay in
+Process.state.
+"""
+import numpy as np
+
+_MISSING = object() # An entry of an Object_Column that is not set
+
+class Column(object):
+    """
+    A field of an Algorithm with a numpy dtype, at every Process of a Network
+
+    Attributes:
+        - values: numpy array of the value of the field at every Process
+        - present: boolean numpy array, True where the field is set
+        - index: the dict from Process to its index in the Network
+    """
+    def __init__(self, dtype, index):
+        """
+        @param dtype: the numpy dtype of the values, e.g. int or bool
+        @param index: the dict from Process to index, shared with the Network
+        """
+        self.values = np.zeros(len(index), dtype=dtype)
+        self.present = np.zeros(len(index), dtype=bool)
+        self.index = index
+
+    def has(self, process):
+        return bool(self.present[self.index[process]])
+
+    def get(self, process):
+        i = self.index[process]
+        if self.present[i]:
+            return self.values.item(i)
+
+    def set(self, process, value):
+        i = self.index[process]
+        self.values[i] = value
+        self.present[i] = True
+
+    def increment(self, process, inc=1):
+        """Adds inc to the field at process, counting from 0 if it is not set"""
+        i = self.index[process]
+        if self.present[i]:
+            self.values[i] += inc
+        else:
+            self.values[i] = inc
+            self.present[i] = True
+
+    def delete(self, process):
+        self.present[self.index[process]] = False
+
+    def read(self):
+        """@return: a read-only copy of the field at every Process. If the
+        field is not set at some Process, it is an object array, with None
+        there."""
+        if self.present.all():
+            values = self.values.copy()
+        else:
+            values = object_column(self.values.tolist())
+            values[~self.present] = None
+        values.flags.writeable = False
+        return values
+
+
+class Object_Column(object):
+    """
+    A field of an Algorithm of dtype object, at every Process of a Network
+
+    Attributes:
+        - values: list of the value of the field at every Process, _MISSING
+        where it is not set
+        - index: the dict from Process to its index in the Network
+    """
+    def __init__(self, index):
+        """@param index: the dict from Process to index, shared with the Network"""
+        self.values = [_MISSING]*len(index)
+        self.index = index
+
+    def has(self, process):
+        return self.values[self.index[process]] is not _MISSING
+
+    def get(self, process):
+        value = self.values[self.index[process]]
+        if value is not _MISSING:
+            return value
+
+    def set(self, process, value):
+        self.values[self.index[process]] = value
+
+    def increment(self, process, inc=1):
+        """Adds inc to the field at process, counting from 0 if it is not set"""
+        i = self.index[process]
+        value = self.values[i]
+        self.values[i] = inc if value is _MISSING else value + inc
+
+    def delete(self, process):
+        self.values[self.index[process]] = _MISSING
+
+    def read(self):
+        """@return: a read-only object array of the field at every Process,
+        None where it is not set"""
+        values = object_column([None if value is _MISSING else value for value in self.values])
+        values.flags.writeable = False
+        return values
+
+
+class Column_Store(object):
+    """The columns of the fields of every Algorithm run on a Network"""
+    def __init__(self, index):
+        """@param index: the dict from Process to index, of the Network"""
+        self.index = index
+        self.columns = {} # algorithm : {field : Column}
+
+    def add(self, algorithm):
+        """
+        Allocates the columns of the fields algorithm declares, in
+        algorithm.fields, and gives them to algorithm
+
+        @return: {field : Column}
+        """
+        columns = {}
+        for field, dtype in algorithm.fields.iteritems():
+            if np.dtype(dtype) == object:
+                columns[field] = Object_Column(self.index)
+            else:
+                columns[field] = Column(dtype, self.index)
+        self.columns[algorithm] = columns
+        algorithm._columns = columns
+        return columns
+
+    def remove(self, algorithm):
+        """Discards the columns of algorithm"""
+        columns = self.columns.pop(algorithm, None)
+        if columns is not None and algorithm._columns is columns:
+            del algorithm._columns
+
+    def column(self, algorithm, field):
+        """@return: the Column of field of algorithm"""
+        return self.columns[algorithm][field]
+
+
+def object_column(values):
+    """@return: a 1-dimensional object array of values, even if they are
+    sequences themselves"""
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
@@ -7,15 +7,39 @@ import collections
 from collections import defaultdict
 from copy import copy
 import numpy as np
-from scipy.linalg import eig
+from scipy.linalg import eigh
 import math
+import heapq
+import inspect
+import os
 import matplotlib 
-matplotlib.use('TkAgg')
+if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+    matplotlib.use('Agg') # No display to draw on, e.g. on a build server
+else:
+    matplotlib.use('TkAgg')
 from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
 from colorizer import *
-from helpers import memoize
-
-class Message:
+from scipy import sparse
+import scipy.sparse.csgraph
+from scipy.sparse.linalg import eigsh
+from helpers import memoize, memoize_version, set_memoized, gc_paused, accepts_args, Random_Set
+from snapshots import Snapshot_Journal, Network_View
+from columns import Column_Store, Object_Column, object_column, _MISSING
+
+# The containers of a Process that has none of its own yet. Never written to.
+_NO_MSGS = {}
+class _Shared_Port_Names(dict):
+    """The port_names of many Processes, as given to Network.name_ports. A
+    Process copies it before it names a port of its own."""
+    __slots__ = ()
+
+_NO_PORT_NAMES = _Shared_Port_Names()
+_NO_REMOTE_PORTS = ()
+_NO_ALGS = frozenset()
+
+class Message(object):
     """
     A Message
 
@@ -23,13 +47,17 @@ class Message:
         - content: The content of this Message
         - algorithm: The Algorithm that required the sending of this Message
         - author: The Process that sent it
+
+    Subclasses should declare __slots__ = () too, so that their instances have
+    no __dict__ either.
     """
+    __slots__ = ('content', 'algorithm', 'author')
+
     def __init__(self, algorithm, content= None):
         """
         @param algorithm: the Algorithm that required the sending of this Message
         @param content: The content of this Message. Can be any type, including None.
         """
-        assert isinstance(algorithm, Algorithm), "Message algorithm must be an instance of Algorithm"
         self.content = content
         self.algorithm = algorithm
         self.author = None
@@ -38,27 +66,82 @@ class Message:
         return self.__class__.__name__+"("+str(self.content)+")"
     
 
-class Process:
+class Process(object):
     """A computing element located at a node of a network graph.
-    Processes are identical except for their UID"""
+    Processes are identical except for their UID
+
+    Every link is numbered at both of its ends when it is created: the Process
+    at index i of out_nbrs sends on out-port i, and the Process at index j of
+    in_nbrs receives on in-port j. Sending and receiving go through these
+    precomputed ports directly. Ports may also be given names, such as 'left'
+    and 'right' in a ring.
+
+    Incoming Messages wait in one mailbox per Algorithm, keyed by in-port, so
+    fetching the Messages of one Algorithm costs only as much as the number of
+    Messages returned. The mailbox of an Algorithm with a combiner holds only
+    the combination of the Messages that arrived.
+
+    A Process has no __dict__, and in_channel, algs, port_names and
+    remote_ports start out as shared empty containers, which are never written
+    to; a Process gets its own the first time it receives a Message, runs an
+    Algorithm, names a port or links to an out_nbr. in_ports and out_ports are
+    only built from in_nbrs and out_nbrs once they are needed, since most
+    Messages are sent on all out-ports, through remote_ports.
+    """
+    __slots__ = ('UID', 'state', 'in_nbrs', 'out_nbrs', '_in_ports', '_out_ports',
+                 'remote_ports', 'port_names', 'network', 'in_channel', 'algs')
+
     def __init__(self, UID, state = None, in_nbrs = [], out_nbrs = []):
         self.UID = UID
         if state is None:
             self.state = defaultdict(dict) # algorithm : state dict
         else:
             self.state = state    
-        self.in_nbrs = in_nbrs or []   # Don't remove or []
-        self.out_nbrs = out_nbrs or [] # Don't remove or []
-
-        self.in_channel = {}
-        self.algs = set()
+        self.in_nbrs = []
+        self.out_nbrs = []
+
+        self._in_ports = None  # in_nbr : in-port of self, once built
+        self._out_ports = None # out_nbr : out-port of self, once built
+        self.remote_ports = _NO_REMOTE_PORTS # out-port : in-port of the out_nbr on that link
+        self.port_names = _NO_PORT_NAMES # name : out-port
+        self.network = None   # the Network the Process belongs to
+        self.in_channel = _NO_MSGS # algorithm : {in-port : [Messages]}
+        self.algs = _NO_ALGS
+
+        for nbr in in_nbrs:
+            nbr.link_to(self)
+        for nbr in out_nbrs:
+            self.link_to(nbr)
+
+    @property
+    def in_ports(self):
+        """{in_nbr : in-port of the Process}"""
+        if self._in_ports is None:
+            self._in_ports = {nbr: port for port, nbr in enumerate(self.in_nbrs)}
+        return self._in_ports
+
+    @property
+    def out_ports(self):
+        """{out_nbr : out-port of the Process}"""
+        if self._out_ports is None:
+            self._out_ports = {nbr: port for port, nbr in enumerate(self.out_nbrs)}
+        return self._out_ports
 
     def link_to(self, new_out_nbr):
         """Adds a new outgoing neighbor of the Process"""
-        if new_out_nbr not in self.out_nbrs:
+        out_ports = self.out_ports
+        if new_out_nbr not in out_ports:
+            out_ports[new_out_nbr] = len(self.out_nbrs)
             self.out_nbrs.append(new_out_nbr)
-        if self not in new_out_nbr.in_nbrs:
-            new_out_nbr.in_nbrs.append(self)
+            in_ports = new_out_nbr.in_ports
+            if self not in in_ports:
+                in_ports[self] = len(new_out_nbr.in_nbrs)
+                new_out_nbr.in_nbrs.append(self)
+            if self.remote_ports is _NO_REMOTE_PORTS:
+                self.remote_ports = []
+            self.remote_ports.append(in_ports[self])
+            if self.network is not None:
+                self.network.version += 1
 
     def bi_link(self, nbr):
         """Adds a new out_nbr of the Process, and adds the
@@ -66,6 +149,21 @@ class Process:
         self.link_to(nbr)
         nbr.link_to(self)
 
+    def name_port(self, name, out_nbr):
+        """
+        Names the out-port of the Process that leads to out_nbr
+
+        @param name: the name of the port, e.g. 'left' or 'right'
+        @param out_nbr: an out_nbr of the Process
+        """
+        if type(self.port_names) is _Shared_Port_Names:
+            self.port_names = dict(self.port_names)
+        self.port_names[name] = self.out_ports[out_nbr]
+
+    def nbr(self, name):
+        """@return: the out_nbr on the port called name"""
+        return self.out_nbrs[self.port_names[name]]
+
     def output(self, key, val, verbose=True):
         """
         Sets the publicly visible value of self.state[key] to val
@@ -87,8 +185,8 @@ class Process:
 
         @param msg: The message to send. This must be an instance of Message.
         @param out_nbrs: The out_nbrs to send the message to. This may be a
-        subset of the Process's out_nbrs, or None, in which case the message
-        will be sent to all out_nbrs
+        subset of the Process's out_nbrs, the name of a port, or None, in which
+        case the message will be sent to all out_nbrs
 
         Effects:
             - Sets msg.author = self
@@ -97,19 +195,57 @@ class Process:
 
         msg.author = self
         if out_nbrs is None:
-            out_nbrs = self.out_nbrs
+            links = zip(self.out_nbrs, self.remote_ports)
         elif isinstance(out_nbrs, Process):
-            out_nbrs = [out_nbrs]
-        if isinstance(out_nbrs, list):
-            msg.algorithm.count_msg(len(out_nbrs))
-            for nbr in out_nbrs:
-                if nbr.in_nbrs.index(self) in nbr.in_channel:
-                    nbr.in_channel[nbr.in_nbrs.index(self)].append(msg)
-                else:
-                    nbr.in_channel[nbr.in_nbrs.index(self)] = [msg]
+            links = [(out_nbrs, out_nbrs.in_ports[self])]
+        elif isinstance(out_nbrs, basestring):
+            port = self.port_names[out_nbrs]
+            links = [(self.out_nbrs[port], self.remote_ports[port])]
+        elif isinstance(out_nbrs, list):
+            links = [(nbr, nbr.in_ports[self]) for nbr in out_nbrs]
         else:
             raise Exception("incorrect type for out_nbrs argument of Process.send_msg()")
 
+        msg.algorithm.count_msg(len(links))
+        transmit = msg.algorithm.transmit
+        if transmit is None:
+            for nbr, port in links:
+                nbr.deliver(msg, port)
+        else:
+            for nbr, port in links:
+                transmit(nbr, port, msg)
+
+    def deliver(self, msg, port):
+        """Puts msg into the incoming channel of the Process on in-port port
+
+        If the Algorithm of msg has a combiner, its mailbox holds a single
+        Message, the combination of all those that arrived, filed under the
+        lowest in-port they arrived on."""
+        algorithm = msg.algorithm
+        in_channel = self.in_channel
+        mailbox = in_channel.get(algorithm)
+        if mailbox is None:
+            if in_channel is _NO_MSGS:
+                in_channel = self.in_channel = {}
+            mailbox = in_channel[algorithm] = {}
+            algorithm.wake(self)
+        combiner = algorithm.combiner
+        if combiner is None or not mailbox:
+            if port in mailbox:
+                mailbox[port].append(msg)
+            else:
+                mailbox[port] = [msg]
+            return
+
+        if isinstance(combiner, basestring):
+            combiner = Algorithm.COMBINERS[combiner]
+        (kept_port, kept), = mailbox.items()
+        if port < kept_port:
+            del mailbox[kept_port]
+            mailbox[port] = [combiner(msg, kept[0])]
+        else:
+            kept[0] = combiner(kept[0], msg)
+
     def get_msgs(self, algorithm, in_nbrs = None):
         """Removes all Messages that relate to a particular Algorithm from the Process'
         incoming channels (or from some subset of incoming channels). Returns them.
@@ -121,31 +257,47 @@ class Process:
         algorithm, and author in in_nbrs
         """
         if in_nbrs is None:
-            in_nbrs = self.in_nbrs[:]
-        elif isinstance(in_nbrs, Process):
-            in_nbrs = [in_nbrs]
-
-        if isinstance(in_nbrs, list):
+            mailbox = self.in_channel.pop(algorithm, None)
+            if not mailbox:
+                return []
+            if len(mailbox) == 1:
+                return mailbox.values()[0]
             msgs = []
-            for in_nbr in in_nbrs:
-                idx = self.in_nbrs.index(in_nbr)
-                if idx in self.in_channel:
-                    i = 0
-                    while i < len(self.in_channel[idx]):
-                        msg = self.in_channel[idx][i]
-                        if msg.algorithm == algorithm:
-                            self.in_channel[idx].pop(i)
-                            msgs.append(msg)
-                        else:
-                            i+=1
+            for port in sorted(mailbox):
+                msgs.extend(mailbox[port])
             return msgs
-        else:
+
+        if isinstance(in_nbrs, Process):
+            in_nbrs = [in_nbrs]
+        if not isinstance(in_nbrs, list):
             raise Exception("incorrect type for in_nbrs argument of Process.get_msgs()")
 
+        mailbox = self.in_channel.get(algorithm)
+        if not mailbox:
+            return []
+        msgs = []
+        for in_nbr in in_nbrs:
+            port = self.in_ports[in_nbr]
+            if port in mailbox:
+                msgs.extend(mailbox.pop(port))
+        if not mailbox:
+            del self.in_channel[algorithm]
+        return msgs
+
+    def has_msgs(self, algorithm):
+        """@return: True iff some Message of algorithm is waiting in the Process' incoming channels"""
+        return algorithm in self.in_channel
+
+    def clear_msgs(self, algorithm):
+        """Discards all Messages of algorithm waiting in the Process' incoming channels"""
+        self.in_channel.pop(algorithm, None)
+
     def add(self, algorithm):
         """Causes the Process to wake up with respect to algorithm"""
+        if self.algs is _NO_ALGS:
+            self.algs = set()
         self.algs.add(algorithm)
-        self.state[algorithm]["diam"] = self.state['n']
+        algorithm.set(self, "diam", self.state['n'])
 
     def terminate(self, algorithm):
         """Causes the Process to halt execution of algorithm"""
@@ -162,6 +314,8 @@ class Process:
 class Network:
     """ A collection of Processes that know n, the # of processes in the network."""
 
+    DENSE_LAYOUT_MAX = 200 # Largest Network whose spectral layout is solved densely
+
     def __init__(self, n = None, index_to_UID = None):
         """
         Creates a network of n disconnected Processes,
@@ -177,18 +331,145 @@ class Network:
             shuffle(self.processes)
 
         self.uid2process = {p.UID: p for p in self.processes}
+        self._index = {p: i for i, p in enumerate(self.processes)}
+        self.store = Column_Store(self._index) # the fields of the Algorithms run on the Network
+
+        self.version = 0 # Incremented whenever a link is added
+        for process in self:
+            process.network = self
 
         for process in self:
             process.state['n'] = n
         
-        self._snapshots = []
+        self._snapshots = Snapshot_Journal()
         self.save_snapshot()
 
         self.arrange_nodes='spectral'
 
+    @staticmethod
+    def from_edges(n, edges, index_to_UID = None, bidirectional = False):
+        """
+        Creates a Network of n Processes, linked in bulk as by link_edges
+
+        @param n: the number of Processes
+        @param edges: m,2 array-like of index pairs (i, j), to link the Process
+        at index i to the Process at index j
+        @param index_to_UID: [Optional] as in Network()
+        @param bidirectional: [Optional] as in link_edges
+        @return: the Network
+        """
+        network = Network(n, index_to_UID)
+        network.link_edges(edges, bidirectional)
+        return network
+
+    @staticmethod
+    def from_scipy_sparse(matrix, index_to_UID = None):
+        """
+        Creates a Network from its adjacency matrix
+
+        @param matrix: n,n scipy.sparse matrix or numpy array, C, such that the
+        Process at index i is linked to the Process at index j iff C[i,j] != 0,
+        as returned by csr(). The out-ports of each Process are numbered in the
+        order of the entries of its row.
+        @param index_to_UID: [Optional] as in Network()
+        @return: the Network
+        """
+        C = sparse.csr_matrix(matrix, copy=True)
+        assert C.shape[0] == C.shape[1], "matrix must be square"
+        C.eliminate_zeros()
+        rows = np.repeat(np.arange(C.shape[0]), np.diff(C.indptr))
+        return Network.from_edges(C.shape[0], np.column_stack((rows, C.indices)), index_to_UID)
+
+    @staticmethod
+    def from_networkx(graph, index_to_UID = None):
+        """
+        Creates a Network with the topology of a networkx graph
+
+        @param graph: a networkx Graph or DiGraph. Each of its nodes is a
+        Process, at the position of the node in graph.nodes(). An edge of an
+        undirected Graph links its Processes both ways.
+        @param index_to_UID: [Optional] as in Network()
+        @return: the Network
+        """
+        nodes = list(graph.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = [(index[u], index[v]) for u, v in graph.edges()]
+        return Network.from_edges(len(nodes), edges, index_to_UID,
+                                  bidirectional=not graph.is_directed())
+
+    def link_edges(self, edges, bidirectional = False):
+        """
+        Adds many links at once. The ports are numbered exactly as if link_to
+        were called on every edge in order, but the links are built in a few
+        vectorized passes, and the topology is only invalidated once. A link
+        that already exists, or is repeated in edges, is only added once.
+
+        @param edges: m,2 array-like of index pairs (i, j), to link self[i] to
+        self[j]
+        @param bidirectional: [Optional] if True, also links self[j] to
+        self[i] right after self[i] to self[j], as bi_link does
+        """
+        n = len(self)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        assert ((edges >= 0) & (edges < n)).all(), "edges must be pairs of Process indices"
+        if bidirectional:
+            edges = np.hstack((edges, edges[:, ::-1])).reshape(-1, 2)
+
+        keys = edges[:, 0]*n + edges[:, 1]
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        out_degrees = np.fromiter((len(p.out_nbrs) for p in self), np.int64, n)
+        in_degrees = np.fromiter((len(p.in_nbrs) for p in self), np.int64, n)
+        linked = out_degrees.any()
+        if linked:
+            C = self.csr().tocoo()
+            first = first[~np.in1d(keys[first], C.row.astype(np.int64)*n + C.col)]
+        if not len(first):
+            return
+        src, dst = edges[first, 0], edges[first, 1]
+
+        # The ports of the new links follow those of the links of each Process
+        by_src = np.argsort(src, kind='mergesort')
+        by_dst = np.argsort(dst, kind='mergesort')
+        out_ports = np.empty(len(src), dtype=np.int64)
+        out_ports[by_src] = _group_ranks(src[by_src]) + out_degrees[src[by_src]]
+        in_ports = np.empty(len(src), dtype=np.int64)
+        in_ports[by_dst] = _group_ranks(dst[by_dst]) + in_degrees[dst[by_dst]]
+
+        processes = object_column(self.processes)
+        out_indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n))))
+        in_indptr = np.concatenate(([0], np.cumsum(np.bincount(dst, minlength=n))))
+        with gc_paused():
+            _extend_links(self.processes, out_indptr.tolist(), processes[dst[by_src]].tolist(),
+                          out_ports[by_src].tolist(), in_ports[by_src].tolist())
+            _extend_links(self.processes, in_indptr.tolist(), processes[src[by_dst]].tolist(),
+                          in_ports[by_dst].tolist())
+
+        self.version += 1
+        if not linked:
+            ones = np.ones(len(src))
+            set_memoized(self, 'csr', sparse.csr_matrix((ones, dst[by_src], out_indptr), shape=(n, n)))
+            set_memoized(self, 'in_csr', sparse.csr_matrix((ones, src[by_dst], in_indptr), shape=(n, n)))
+
+    def name_ports(self, names, indices = None):
+        """
+        Names the same out-ports of many Processes at once. The Processes share
+        names until one of them names another port, as by Process.name_port.
+
+        @param names: {name : out-port}, e.g. {'right': 0, 'left': 1}
+        @param indices: [Optional] the indices of the Processes. Defaults to all
+        """
+        names = _Shared_Port_Names(names)
+        processes = self.processes if indices is None else [self[i] for i in indices]
+        for p in processes:
+            if p.port_names:
+                p.port_names = dict(p.port_names, **names)
+            else:
+                p.port_names = names
+
     def add(self, algorithm):
         """Awakens all Processes in the Network with respect to algorithm"""
         self.algs.append(algorithm)
+        self.store.add(algorithm)
         for process in self:
             process.add(algorithm)
 
@@ -204,27 +485,62 @@ class Network:
                 - http://www.research.att.com/export/sites/att_labs/groups/infovis/res/legacy_papers/DBLP-journals-camwa-Koren05.pdf
             - 'circular' draws graph in a circular layout
             - default None uses self.arrange_nodes
+
+        The layout is cached per arrange_nodes until a link is added to the
+        Network, so redrawing, e.g. while scrubbing through snapshots in a
+        simulator, never recomputes it.
+
+        @return: read-only n,2 numpy array of the coordinates of the Processes,
+        ordered by index
         """
         if arrange_nodes is None:
             arrange_nodes = self.arrange_nodes
-        if arrange_nodes == 'spectral':
-            n = len(self)
-            L = self._laplacian()
-            D = np.diag(self.degrees())
-            w, v = eig(L, D)
-            v = v.T
+        return self._layout(arrange_nodes)
 
-            idx = w.argsort()
-            v = v[idx]
-            x_vals, y_vals = v[1], v[2]
-            vals = zip(x_vals, y_vals)
+    @memoize_version
+    def _layout(self, arrange_nodes):
+        vals = None
+        if arrange_nodes == 'spectral':
+            vals = self._spectral_coords()
+            if vals is None:
+                arrange_nodes = 'circular'
 
         if arrange_nodes == 'circular':
-            n = len(self)
-            vals = []
-            for k in range(n):
-                vals.append( [math.cos(2*k*math.pi/n), math.sin(2*k*math.pi/n) ] )
-        return vals        
+            angles = 2*np.pi*np.arange(len(self))/len(self)
+            vals = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        if vals is None:
+            raise Exception("Unknown layout: "+str(arrange_nodes))
+        return _read_only(vals)
+
+    def _spectral_coords(self):
+        """
+        Computes the spectral layout from the 2nd and 3rd smallest generalized
+        eigenvectors of L v = w D v, where L is the Laplacian and D the degree
+        matrix. Small Networks are solved densely; larger ones with a sparse
+        shift-invert Lanczos solver, which finds only those 3 eigenvectors.
+
+        @return: n,2 numpy array of coordinates, ordered by index, or None if the
+        Network is too small, disconnected, or has a Process of degree 0.
+        """
+        n = len(self)
+        D = self.degrees()
+        if n < 3 or not D.all():
+            return None
+        if sparse.csgraph.connected_components(self._sparse_adjacency(), directed=False)[0] > 1:
+            return None
+
+        if n <= Network.DENSE_LAYOUT_MAX:
+            w, v = eigh(self._laplacian(), np.diag(D))
+        else:
+            # Shifting just below the smallest eigenvalue, 0, keeps L - sigma*D
+            # positive definite. The 2nd smallest eigenvalue can be as small as
+            # O(1/n^2), so the shift must be too, for the solver to converge quickly
+            v0 = np.random.RandomState(0).rand(n)
+            w, v = eigsh(self._laplacian(sparse=True), k=3, M=_diags(D),
+                         sigma=-1./n**2, which='LM', v0=v0)
+        v = v[:, w.argsort()[1:3]]
+        return v / np.linalg.norm(v, axis=0)
 
     def get_edge_coords(self, vertex_coords):
         edges = []
@@ -237,25 +553,40 @@ class Network:
         """
         Draws the network
         """
-        def setup():
-            self.fig = plt.figure()
-            self.ax = self.fig.add_subplot(111)
-            self.ax.get_xaxis().set_visible(False)
-            self.ax.get_yaxis().set_visible(False)
+        self.fig = plt.figure()
+        self.ax = self.fig.add_subplot(111)
+        self.ax.get_xaxis().set_visible(False)
+        self.ax.get_yaxis().set_visible(False)
+        self.draw_on(self.ax)
+
+    def draw_on(self, ax, t=None, arrange_nodes=None):
+        """
+        Draws the network on matplotlib Axes ax, with all edges as a single
+        LineCollection and all Processes as a single scatter. Edges are drawn
+        once per pair of linked Processes, and edges colored by an Algorithm
+        are drawn again, on top of them.
+
+        @param t: [Optional] draws the Network as it was at snapshot t.
+        Defaults to the current state.
+        @param arrange_nodes: [Optional] the layout, as in general_draw
+        @return: the LineCollection of the edges and the PathCollection of the Processes
+        """
+        node_colors, edge_colors = self.get_colors(t)
+        return draw_graph(ax, self.get_vertex_coords(arrange_nodes), self.edges(),
+                          node_colors, edge_colors)
 
-        def e_draw(edge, color=Color.black):
-            color = color.toMpl()
-            x_vals, y_vals = zip(*edge)
-            self.ax.plot(x_vals, y_vals, color)
-            
-        def v_draw(vertex, process, color=Color.black):
-            color = color.toMpl()+'o'
-            x, y = vertex
-            self.ax.plot( [x], [y], color)
+    @memoize_version
+    def edges(self):
+        """
+        Cached until a link is added to the Network, so it must not be modified.
 
-        self.general_draw(v_draw, e_draw, setup=setup)
+        @return: m,2 numpy array of the index pairs (i, j), i <= j, of the
+        Processes that are linked, each pair once
+        """
+        A = sparse.triu(self._sparse_adjacency()).tocoo()
+        return _read_only(np.column_stack((A.row, A.col)))
 
-    def general_draw(self, v_draw, e_draw, setup=None, show=None, arrange_nodes=None):
+    def general_draw(self, v_draw, e_draw, setup=None, show=None, arrange_nodes=None, t=None):
         """
         @param arrange_nodes:
             - 'spectral' draws graph in a spectral graph layout
@@ -263,9 +594,13 @@ class Network:
                 - http://www.research.att.com/export/sites/att_labs/groups/infovis/res/legacy_papers/DBLP-journals-camwa-Koren05.pdf
             - 'circular' draws graph in a circular layout
             - default None uses self.arrange_nodes
+        @param t: [Optional] draws the Network as it was at snapshot t, without
+        restoring that snapshot. Defaults to the current state.
         """
+        network = self if t is None else self.view(t)
         vertices = self.get_vertex_coords(arrange_nodes)
         edges = self.get_edge_coords(vertices)
+        node_colors, edge_colors = self.get_colors(t)
 
         if setup is not None:
             setup()
@@ -273,29 +608,46 @@ class Network:
         for edge in edges:
             e_draw(edge)
 
-        for vertex, process in zip(vertices, self):
-            v_draw(vertex, process)
+        for (i, j), edge_color in edge_colors.iteritems():
+            e_draw((vertices[i], vertices[j]), color=edge_color)
+
+        for vertex, process, node_color in zip(vertices, network, node_colors):
+            v_draw(vertex, process, color=node_color)
 
+        if show is not None:
+            show()
+
+    def get_colors(self, t=None):
+        """
+        Combines the colors that the Algorithms run on the Network give its
+        Processes and edges. Where they disagree, the Algorithm run last wins.
+
+        @param t: [Optional] colors the Network as it was at snapshot t.
+        Defaults to the current state.
+        @return: (node_colors, edge_colors). node_colors is the list of the
+        Colors of all Processes, ordered by index. edge_colors maps (i, j) to
+        the Color of the edge between self[i] and self[j], for the edges an
+        Algorithm colors; the others are Color.black.
+        """
+        network = self if t is None else self.view(t)
+        node_colors = [Color.black]*len(self)
+        edge_colors = {}
         for alg in self.algs:
             try:
-                node_colors, edge_colors = alg.get_draw_args(self)
+                alg_node_colors, alg_edge_colors = alg.get_draw_args(network)
             except AttributeError:
                 continue # this alg has no alg-specific drawing arguments
 
-            if edge_colors:
-                for (p_UID, parent_UID), edge_color in edge_colors.iteritems():
-                    v1 = vertices[self.index(self.uid2process[p_UID])]
-                    v2 = vertices[self.index(self.uid2process[parent_UID])]
-                    e_draw((v1, v2), color=edge_color)
+            if alg_edge_colors:
+                for (p_UID, parent_UID), edge_color in alg_edge_colors.iteritems():
+                    i = self.index(self.uid2process[p_UID])
+                    j = self.index(self.uid2process[parent_UID])
+                    edge_colors[(i, j)] = edge_color
 
-            if node_colors:
-                for p_UID,node_color in node_colors.iteritems():
-                    p = self.uid2process[p_UID]
-                    v = vertices[self.index(p)]
-                    v_draw(v, p, color=node_color)
-
-        if show is not None:
-            show()
+            if alg_node_colors:
+                for p_UID, node_color in alg_node_colors.iteritems():
+                    node_colors[self.index(self.uid2process[p_UID])] = node_color
+        return node_colors, edge_colors
 
     def start_simulation(self):
         try:
@@ -307,24 +659,78 @@ class Network:
                 raise Exception("You must install PyQt or Tkinter for this feature")
         simulate(self)
 
+    def export(self, path, snapshots=None, workers=None, **kwargs):
+        """
+        Renders snapshots of the Network without a display, in parallel, into
+        numbered PNG frames or an animated GIF or MP4.
+
+        @param path: a directory for the frames, or a .gif or .mp4 file name
+        @param snapshots: [Optional] None for every snapshot, k for every k-th,
+        or a list of snapshot times
+        @param workers: [Optional] the number of rendering processes. Defaults
+        to the number of CPUs.
+        @param kwargs: [Optional] fps, figsize and dpi, as in export.export
+        @return: the paths of the frames, or of the animation
+        """
+        from export import export
+        return export(self, path, snapshots=snapshots, workers=workers, **kwargs)
+
     def restore_snapshot(self, t):
-        try:
-            snapshot = self._snapshots[t]
-        except IndexError:
-            raise IndexError("No snapshot at time "+str(t))
-        
-        for i, p in enumerate(self):
-            p.state = self._snapshots[t][i]
+        """Sets the state of every Process to its state at snapshot t"""
+        states = self._snapshots.states(t)
+        for p, state in zip(self, states):
+            p.state = defaultdict(dict)
+            for key, val in state.iteritems():
+                p.state[key] = copy(val) if isinstance(val, dict) else val
+
+    def view(self, t):
+        """
+        @return: a read-only view of the Network at snapshot t. Its Processes
+        have the state they had at snapshot t; the live state is left untouched.
+        """
+        return Network_View(self, self._snapshots.states(t))
 
     def get_snapshot(self):
         return [copy(process.state) for process in self]
         
-    def save_snapshot(self):
-        self._snapshots.append(self.get_snapshot())
+    def save_snapshot(self, keys=None, processes=None):
+        """
+        Appends a snapshot of the state of every Process to self._snapshots
+
+        @param keys: [Optional] the only state keys to record. The other keys
+        keep the values they had in the previous snapshot. Defaults to all keys.
+        @param processes: [Optional] the only Processes whose state may have
+        changed since the previous snapshot. Defaults to all Processes.
+        """
+        indices = None
+        if processes is not None:
+            indices = [self._index[p] for p in processes]
+        self._snapshots.record([process.state for process in self], indices, keys)
 
     def count_snapshots(self):
         return len(self._snapshots)
 
+    def column(self, key, algorithm=None):
+        """
+        Reads one state key of every Process at once
+
+        @param key: a key of the public state of the Processes, e.g. 'status',
+        or a field of algorithm
+        @param algorithm: [Optional] the Algorithm whose private state key is
+        in. It must not have halted. Defaults to the public state.
+        @return: read-only numpy array of the value of key at every Process,
+        ordered by index, None where it is missing. A field algorithm declares
+        comes with the dtype it was declared with, if it is set everywhere.
+        """
+        if algorithm is None:
+            values = [process.state.get(key) for process in self]
+        elif key in algorithm._columns:
+            return algorithm._columns[key].read()
+        else:
+            values = [process.state[algorithm].get(key) if algorithm in process.state else None
+                      for process in self]
+        return _read_only(object_column(values))
+
     def state(self):
         """
         @return: A human-readable representation of the state of all the
@@ -332,26 +738,71 @@ class Network:
         """
         return [str(process)+" => "+str(dict(process.state)) for process in self]
     
-    # @memoize
-    def adjacency_matrix(self):
+    @memoize_version
+    def csr(self):
+        """
+        The topology of the Network, as a sparse matrix.
+
+        Cached until a link is added to the Network.
+
+        @return: n,n scipy.sparse CSR matrix, C, such that C[i,j] = 1 if
+        self[j] is an out_nbr of self[i], else 0.
+        """
+        indptr = [0]
+        indices = []
+        for p in self:
+            indices.extend(self._index[nbr] for nbr in p.out_nbrs)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+                                 shape=(len(self), len(self)))
+
+    @memoize_version
+    def in_csr(self):
+        """
+        The incoming links of the Network, as a sparse matrix.
+
+        Cached until a link is added to the Network.
+
+        @return: n,n scipy.sparse CSR matrix, C, such that C[j,i] = 1 if
+        self[i] is an in_nbr of self[j], else 0. The column indices of row j
+        are ordered by the in-port of self[j] they arrive on, so they are not
+        sorted.
+        """
+        indptr = [0]
+        indices = []
+        for p in self:
+            indices.extend(self._index[nbr] for nbr in p.in_nbrs)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+                                 shape=(len(self), len(self)))
+
+    @memoize_version
+    def _sparse_adjacency(self):
+        """@return: the adjacency matrix of the Network, as a CSR matrix"""
+        C = self.csr()
+        A = ((C + C.T) > 0).astype(float)
+        A.eliminate_zeros()
+        return A.tocsr()
+
+    @memoize_version
+    def adjacency_matrix(self, sparse=False):
         """
         Returns the (symmetric) n,n adjacency matrix of the undirected graph that
         has a vertex for every Process of this network, and an edge between
         vertices i and j, if Process self[i] is an in_nbr or out_nbr of Process
         self[j].
 
-        Memoized because Networks are assumed to be static.
+        Cached until a link is added to the Network, so it must not be modified.
 
+        @param sparse: [Optional] if True, returns a scipy.sparse CSR matrix
+        instead of a dense array.
         @return: Matrix, A, such that A[i][j] = 1
         if self[i] is an in_nbr or out_nbr of self[j], else 0.
         """
-        A = np.zeros(shape=(len(self), len(self)))
-        for i in xrange(len(self)):
-            i_nbrs = set(self[i].in_nbrs+self[i].out_nbrs)
-            for j in xrange(len(self)):
-                if self[j] in i_nbrs:
-                    A[i][j] = 1.
-        return A
+        A = self._sparse_adjacency()
+        if sparse:
+            return A
+        return _read_only(A.toarray())
 
     def adjacent(self, i, j):
         """
@@ -365,20 +816,17 @@ class Network:
             i, j = self.index(i), self.index(j)
         assert isinstance(i, int) and isinstance(j, int), "i and j must be integer Process indices"
 
-        return self.adjacency_matrix()[i][j]==1
-    
-    # @memoize
+        p, q = self[i], self[j]
+        return q in p.out_ports or q in p.in_ports
+
+    @memoize_version
     def degrees(self):
         """
+        Cached until a link is added to the Network, so it must not be modified.
+
         @return: the size n array containing the degree of each process, ordered by index.
         """
-        A = self.adjacency_matrix()
-        D = np.zeros(shape=(len(self),))
-
-        for i in xrange(len(self)):
-            D[i] = sum(A[i])
-
-        return D
+        return _read_only(np.asarray(self._sparse_adjacency().sum(axis=1)).ravel())
 
     def degree(self, p):
         """Returns the number of other Processes Process p is connected to.
@@ -390,23 +838,22 @@ class Network:
         assert isinstance(p, int) and p>=0 and p<len(self), "p must be a Process or an integer Process index"
         return self.degrees()[p]
 
-    # @memoize
-    def _laplacian(self):
+    @memoize_version
+    def _laplacian(self, sparse=False):
         """
+        Cached until a link is added to the Network, so it must not be modified.
+
+        @param sparse: [Optional] if True, returns a scipy.sparse CSR matrix
+        instead of a dense array.
         @return: the Laplacian, L. A symmetric n,n matrix associated with the graph,
         where L[i][j] = deg(i) if i = j, -1 if adjacent(i,j), and 0 otherwise
         """
-        D = np.diag(self.degrees())
-        L = np.zeros(shape=(len(self), len(self)))
-        
-        for i in xrange(len(self)):
-            for j in xrange(len(self)):
-                if i == j:
-                    L[i][j] = D[i][i]
-                elif self.adjacent(i,j):
-                    L[i][j] = -1. #-w_{i,j}/ in a weighted graph
-        
-        return L
+        A = self._sparse_adjacency()
+        L = _diags(self.degrees()) - (A - _diags(A.diagonal()))
+        L = L.tocsr()
+        if sparse:
+            return L
+        return _read_only(L.toarray())
 
     def __getitem__(self, i):
         return self.processes[i]
@@ -421,10 +868,107 @@ class Network:
         return iter(self.processes)
     
     def index(self, p):
-        return self.processes.index(p)    
+        return self._index[p]    
     
 
-class Algorithm:
+def _read_only(array):
+    """@return: numpy array, after making it read-only"""
+    array.flags.writeable = False
+    return array
+
+def _diags(values):
+    """@return: the sparse diagonal matrix with diagonal values"""
+    return sparse.diags(values, 0, format='csr')
+
+def _group_ranks(groups):
+    """@return: numpy array of the position of every element of the sorted
+    numpy array groups among the elements equal to it"""
+    positions = np.arange(len(groups))
+    starts = np.ones(len(groups), dtype=bool)
+    starts[1:] = groups[1:] != groups[:-1]
+    return positions - np.maximum.accumulate(np.where(starts, positions, 0))
+
+def _extend_links(processes, indptr, nbrs, ports, remote_ports=None):
+    """
+    Appends new links to the Processes, as Network.link_edges does
+
+    @param processes: the Processes, ordered by index
+    @param indptr: the links of processes[i] are nbrs[indptr[i]:indptr[i+1]]
+    @param nbrs: the Processes at the other end of the links
+    @param ports: the ports of the links at processes[i]
+    @param remote_ports: [Optional] the ports of the links at nbrs, if the
+    links are outgoing. If None, the links are incoming.
+    """
+    for p, start, end in zip(processes, indptr, indptr[1:]):
+        if start == end:
+            continue
+        links = nbrs[start:end]
+        if remote_ports is None:
+            if p.in_nbrs:
+                p.in_nbrs.extend(links)
+            else:
+                p.in_nbrs = links
+            if p._in_ports is not None:
+                p._in_ports.update(zip(links, ports[start:end]))
+        else:
+            if p.out_nbrs:
+                p.out_nbrs.extend(links)
+                p.remote_ports.extend(remote_ports[start:end])
+            else:
+                p.out_nbrs = links
+                p.remote_ports = remote_ports[start:end]
+            if p._out_ports is not None:
+                p._out_ports.update(zip(links, ports[start:end]))
+
+def segment_reduce(ufunc, values, indptr, empty):
+    """
+    Reduces consecutive segments of values, such as the values gathered on the
+    links of every row of a CSR matrix
+
+    @param ufunc: the binary numpy ufunc to reduce with, e.g. np.maximum
+    @param values: numpy array of the values of all segments, back to back
+    @param indptr: the boundaries of the segments, as in a CSR matrix:
+    segment k is values[indptr[k]:indptr[k+1]]
+    @param empty: the result of an empty segment, or an array of the result
+    of every segment, if it is empty
+    @return: numpy array of the reduction of every segment
+    """
+    starts = indptr[:-1]
+    nonempty = starts < indptr[1:]
+    result = np.empty(len(starts), dtype=np.result_type(values, np.asarray(empty)))
+    result[...] = empty
+    if nonempty.any():
+        result[nonempty] = ufunc.reduceat(values, starts[nonempty])
+    return result
+
+
+def draw_graph(ax, vertices, edges, node_colors, edge_colors=None):
+    """
+    Draws a graph on matplotlib Axes ax, with all edges as a single
+    LineCollection and all vertices as a single scatter
+
+    @param vertices: n,2 array of the coordinates of the vertices
+    @param edges: m,2 array of the index pairs of the ends of the edges, drawn black
+    @param node_colors: list of the n Colors of the vertices
+    @param edge_colors: [Optional] dict from index pair to Color, of edges drawn
+    again, on top of the black ones
+    @return: the LineCollection of the edges and the PathCollection of the vertices
+    """
+    ends = np.asarray(edges).reshape(-1, 2)
+    colors = np.tile(to_rgba(Color.black.toMpl()), (len(ends), 1))
+    if edge_colors:
+        ends = np.vstack((ends, list(edge_colors)))
+        colors = np.vstack((colors, [to_rgba(color.toMpl()) for color in edge_colors.itervalues()]))
+
+    lines = LineCollection(vertices[ends], colors=colors, zorder=1)
+    ax.add_collection(lines)
+    ax.autoscale_view()
+    points = ax.scatter(vertices[:, 0], vertices[:, 1], zorder=2,
+                        c=[color.toMpl() for color in node_colors])
+    return lines, points
+
+
+class Algorithm(object):
     """Abstract superclass for a distributed algorithm."""
 
     """Verbosity levels
@@ -436,8 +980,20 @@ class Algorithm:
     """
     SILENT, QUIET, DEFAULT, VERBOSE = 0, 1, 2, 3
 
+    """Snapshot policies, self.params['snapshots']
+
+    True : A snapshot after every round (default)
+    False : No snapshots whatsoever
+    'final' : A snapshot only once the Algorithm halts
+    k : A snapshot every k rounds, and once the Algorithm halts
+    [keys] : A snapshot after every round, of only the listed state keys
+    {'every': True, False, 'final' or k, 'keys': [keys]} : Combines the above
+
+    The snapshot taken once the Algorithm halts always records every key.
+    """
+
     """Default initialization of self.params"""
-    DEFAULT_PARAMS = {'draw' : False, 'verbosity': DEFAULT}
+    DEFAULT_PARAMS = {'draw' : False, 'verbosity': DEFAULT, 'snapshots': True}
 
     def __init__(self, network = None, params = {}, name = None):
         """
@@ -461,12 +1017,56 @@ class Algorithm:
     
     def trans_i(self, p, msgs):
         """Determines what state transition a Process, p, will perform,
-        having received messages, msgs"""
+        having received messages, msgs
+
+        May also be defined as trans_i(self, p), if p fetches its own messages."""
         pass
     
     def halt_i(self, p):
         """Returns True iff Process p has halted execution of the algorithm"""
         return self not in p.algs
+
+    def wake(self, p):
+        """Called when a Message of this Algorithm arrives at Process p, while
+        none of its other Messages of this Algorithm are waiting to be received"""
+        pass
+
+    """If not None, transmit(receiver, port, msg) is called for every Message
+    of this Algorithm sent, instead of delivering it immediately"""
+    transmit = None
+
+    """Message combiner. If not None, the Messages of this Algorithm waiting at
+    a Process are folded into one as they arrive, so trans_i receives at most
+    one Message per round, and a mailbox holds one Message instead of one per
+    link. message_count still counts every Message sent. Either
+        - the name of one of Algorithm.COMBINERS, or
+        - a method combiner(self, a, b), that returns the Message that stands
+        for both Messages a and b. a arrived on a lower in-port than b, or
+        stands for a Message that did.
+    Only for Algorithms whose trans_i depends on no more than the combined
+    Message; the authors of the other Messages are lost."""
+    combiner = None
+
+    """True if the Algorithm makes random choices. benchmark.sample also
+    detects the use of random and numpy.random by itself, so this only needs
+    to be declared by an Algorithm that draws from another source, e.g. its
+    own random.Random instance."""
+    randomized = False
+
+    """The fields of the state of this Algorithm to store by column, in
+    network.store, rather than in Process.state, {field : numpy dtype}, e.g.
+    {'val': int, 'send': object}. get, set, has, increment and delete read and
+    write them the same way as the other fields. Fields are not recorded in
+    snapshots."""
+    fields = {}
+    _columns = {} # field : Column, while the Algorithm runs
+
+    COMBINERS = {
+        'max': lambda a, b: b if b.content > a.content else a,
+        'min': lambda a, b: b if b.content < a.content else a,
+        'first': lambda a, b: a,   # The Message on the lowest in-port
+        'any': lambda a, b: a if a.content else b, # A Message with true content, if any
+    }
     
     def cleanup_i(self,p):
         """Determines what final state transition a Process, p, will perform,
@@ -477,8 +1077,10 @@ class Algorithm:
         """Calls cleanup_i on all processes"""
         for process in self.network:
             self.cleanup_i(process)
+            process.clear_msgs(self)
             if self in process.state:
                 del process.state[self]
+        self.network.store.remove(self)
 
     def __call__(self, network, params = {}):
         """Same as run, allows an algorithm, A, to be executed like this: A()"""
@@ -504,15 +1106,67 @@ class Algorithm:
             print str(network)
 
         self.network = network
+        self._snapshot_every, self._snapshot_keys = self._snapshot_policy()
+        self._trans_takes_msgs = not accepts_args(self.trans_i, 1)
         network.add(self)
 
-    def halt(self):
-        if all([self.halt_i(process) for process in self.network]):
-            self.halted = True
-            self.cleanup()
-            if self.params['verbosity'] >= Algorithm.QUIET:
-                self.print_algorithm_terminated()
+    def _snapshot_policy(self):
+        """
+        Parses self.params['snapshots']
+
+        @return: (every, keys), where every is 0 if snapshots are disabled,
+        'final', or the number of rounds between snapshots, and keys is None
+        or the set of state keys to record.
+        """
+        policy = self.params.get('snapshots', True)
+        if isinstance(policy, dict):
+            every, keys = policy.get('every', True), policy.get('keys')
+        elif isinstance(policy, (list, tuple, set, frozenset)):
+            every, keys = True, policy
+        else:
+            every, keys = policy, None
+
+        if every is None or every is False:
+            every = 0
+        elif every is True:
+            every = 1
+        elif every != 'final' and not (isinstance(every, int) and every > 0):
+            raise Exception("Invalid snapshot policy: "+str(policy))
+        if keys is not None:
+            keys = set(keys)
+        return every, keys
+
+    def snapshot(self, final=False, processes=None):
+        """
+        Saves a snapshot of the Network, as dictated by self.params['snapshots']
+
+        @param final: True iff the Algorithm has halted
+        @param processes: [Optional] the only Processes whose state may have
+        changed since the previous snapshot. Defaults to all Processes.
+        @return: True iff a snapshot was saved
+        """
+        every = self._snapshot_every
+        if not every:
+            return False
+        if final:
             self.network.save_snapshot()
+        elif every != 'final' and self.r % every == 0:
+            self.network.save_snapshot(self._snapshot_keys, processes)
+        else:
+            return False
+        return True
+
+    def halt(self):
+        """Halts the Algorithm if every Process has halted"""
+        if all(self.halt_i(process) for process in self.network):
+            self._halt()
+
+    def _halt(self):
+        self.halted = True
+        self.cleanup()
+        if self.params['verbosity'] >= Algorithm.QUIET:
+            self.print_algorithm_terminated()
+        self.snapshot(final=True)
 
     def print_algorithm_terminated(self):
         print self.name+" Terminated"
@@ -523,22 +1177,50 @@ class Algorithm:
     def count_msg(self, message_count):
         self.message_count += message_count
 
+    # Object_Columns are read and written inline, since get and set are called
+    # in nearly every step of an Algorithm
+
     def set(self, process, state, value):
-        process.state[self][state] = value
+        column = self._columns.get(state)
+        if column is None:
+            process.state[self][state] = value
+        elif type(column) is Object_Column:
+            column.values[column.index[process]] = value
+        else:
+            column.set(process, value)
     
     def increment(self, process, state, inc=1):
-        process.state[self][state] += inc
+        column = self._columns.get(state)
+        if column is None:
+            process.state[self][state] += inc
+        else:
+            column.increment(process, inc)
     
     def has(self, process, state):
-        return state in process.state[self]
+        column = self._columns.get(state)
+        if column is None:
+            return state in process.state[self]
+        if type(column) is Object_Column:
+            return column.values[column.index[process]] is not _MISSING
+        return column.has(process)
     
     def get(self, process, state):
-        if self.has(process, state):
-            return process.state[self][state]
+        column = self._columns.get(state)
+        if column is None:
+            return process.state[self].get(state)
+        if type(column) is Object_Column:
+            value = column.values[column.index[process]]
+            if value is not _MISSING:
+                return value
+            return
+        return column.get(process)
     
     def delete(self, process, state):
-        if self.has(process, state):
-            del process.state[self][state]
+        column = self._columns.get(state)
+        if column is None:
+            process.state[self].pop(state, None)
+        else:
+            column.delete(process)
     
     def output(self, process, key, val):
         """
@@ -559,6 +1241,10 @@ class Synchronous_Algorithm(Algorithm):
     """
     We assume that Processes take steps simultaneously,
     that is, that execution proceeds in synchronous rounds.
+
+    Only the active Processes, those that have not halted, are visited in a
+    round. self.active is pruned after every round, so a round costs time
+    proportional to the number of active Processes and Messages sent.
     """
     def run(self, network, params = {}):
         Algorithm.run(self, network, params)
@@ -567,6 +1253,8 @@ class Synchronous_Algorithm(Algorithm):
     def execute(self):
         self.halted = False
         self.r = 0
+        self.active = [process for process in self.network if not self.halt_i(process)]
+        self._touched = None # Processes active since the last snapshot. None is all.
         while not self.halted:
             self.r+=1
             if self.params['verbosity'] >= Algorithm.DEFAULT:
@@ -578,20 +1266,32 @@ class Synchronous_Algorithm(Algorithm):
         """Executes a single round of the Synchronous Algorithm"""
         self.msgs()
         self.trans()
-        self.network.save_snapshot()
+        self.active = [process for process in self.active if not self.halt_i(process)]
+        if self.snapshot(processes=self._touched):
+            self._touched = self.active
     
     def msgs(self):
-        for process in self.network:
+        for process in self.active:
             if self.halt_i(process): continue
             self.msgs_i(process)
     
     def trans(self):
-        for process in self.network:
+        takes_msgs = self._trans_takes_msgs
+        for process in self.active:
             if self.halt_i(process): continue
-            try: #Checks if function trans_i(self, p) is defined
-                self.trans_i(process)
-            except TypeError: #Otherwise, tries function trans_i(self, p, msgs)
+            if takes_msgs:
                 self.trans_i(process, process.get_msgs(self))
+            else:
+                self.trans_i(process)
+
+    def halt(self):
+        """Halts the Algorithm if every Process has halted"""
+        if not self.active:
+            self._halt()
+
+    def halted_count(self):
+        """@return: the number of Processes that have halted"""
+        return len(self.network) - len(self.active)
     
     def print_algorithm_terminated(self):
         print self.name+" Terminated"
@@ -605,71 +1305,335 @@ class Synchronous_Algorithm(Algorithm):
 class Do_Nothing(Synchronous_Algorithm):
     def trans_i(self, p, messages): p.terminate(self)
 
+
+class Array_Algorithm(Synchronous_Algorithm):
+    """
+    A Synchronous_Algorithm whose rounds are whole-Network array operations,
+    instead of a call of msgs_i and trans_i per Process.
+
+    The state of the Processes is kept in numpy arrays, ordered by index. A
+    round gathers the values sent on the links of the Network, taken from its
+    CSR topology, and reduces them per receiver, so no Message is allocated.
+    message_count and r are those of the per-Process version of the Algorithm.
+
+    Subclasses define:
+        - setup(): initializes the state arrays from the state of the Processes
+        - step(): executes round self.r. Calls count_msg for the Messages sent
+        in it, and clears self.active[i] once self.network[i] halts. May skip
+        to a later round, by increasing self.r, over rounds in which the state
+        cannot change.
+        - finish(): outputs the results of the Processes, once all have halted
+
+    Since the state of the Processes is only written once the Algorithm halts,
+    only the final snapshot is recorded.
+    """
+    def execute(self):
+        self.halted = False
+        self.r = 0
+        n = len(self.network)
+        C = self.network.csr()
+        self.out_indptr, self.out_indices = C.indptr, C.indices
+        self.out_degrees = np.diff(C.indptr)
+        self.link_senders = np.repeat(np.arange(n), self.out_degrees) # the sender on each out-link
+        C = self.network.in_csr()
+        self.in_indptr, self.in_indices = C.indptr, C.indices # in_indices are in in-port order
+        self.active = np.array([not self.halt_i(process) for process in self.network], dtype=bool)
+        self.setup()
+        while not self.halted:
+            self.r+=1
+            if self.params['verbosity'] >= Algorithm.DEFAULT:
+                print "Round",self.r
+            self.step()
+            self.halt()
+
+    def setup(self):
+        """Initializes the state arrays"""
+        pass
+
+    def step(self):
+        """Executes round self.r"""
+        pass
+
+    def finish(self):
+        """Outputs the results of the Processes"""
+        pass
+
+    def round(self):
+        self.step()
+
+    def halt(self):
+        """Halts the Algorithm if every Process has halted"""
+        if not self.active.any():
+            self.finish()
+            for process in self.network:
+                process.terminate(self)
+            self._halt()
+
+    def halted_count(self):
+        """@return: the number of Processes that have halted"""
+        return len(self.network) - int(self.active.sum())
+
+    def send(self, senders):
+        """
+        Counts the Messages sent by senders to all their out_nbrs
+
+        @param senders: boolean array, True for the Processes that send, or
+        array of their indices
+        """
+        self.count_msg(int(self.out_degrees[senders].sum()))
+
+    def out_links(self, senders):
+        """
+        Finds the out-links of some Processes, so that a round in which only a
+        few Processes send costs time proportional to their out-links only
+
+        @param senders: array of the indices of the Processes
+        @return: array of the positions of all their out-links in
+        self.out_indices and self.link_senders
+        """
+        counts = self.out_degrees[senders]
+        starts = self.out_indptr[senders] - np.cumsum(counts) + counts
+        return np.repeat(starts, counts) + np.arange(counts.sum())
+
+    def gather(self, ufunc, values, empty, senders=None):
+        """
+        Sends values on every link, and reduces the values each Process receives
+
+        @param ufunc: the binary numpy ufunc to reduce with, e.g. np.maximum
+        @param values: numpy array of the value each Process sends
+        @param empty: the result for a Process that receives nothing, or an array
+        of the result for every Process. Must be an identity of ufunc, if
+        senders is given.
+        @param senders: [Optional] boolean array, True for the Processes that
+        send. Defaults to all of them.
+        @return: numpy array of the reduction of the values each Process receives
+        """
+        received = values[self.in_indices]
+        if senders is not None:
+            received = np.where(senders[self.in_indices], received, empty)
+        return segment_reduce(ufunc, received, self.in_indptr, empty)
+
     
 class Asynchronous_Algorithm(Algorithm):
     """
     We assume that the separate Processes take steps
     in an arbitrary order, at arbitrary relative speeds.
+
+    Execution is driven by self.params['scheduler']:
+        - 'random' (default): Takes a step chosen uniformly at random among the
+        enabled ones.
+        - 'events': A discrete-event simulation. Every Message is delivered
+        after a delay drawn from the model of its channel, given by
+        self.params['delay'], and Processes step as soon as Messages arrive.
+        Reports the simulated time the execution took in self.time.
+
+    Delay models, self.params['delay']
+        - c : a constant delay c
+        - 'normalized' (default) : Uniform in (0, 1], the normalization in which
+        asynchronous time complexity is measured
+        - 'uniform' or ('uniform', low, high) : Uniform in [low, high], by default [0, 1]
+        - 'exponential' or ('exponential', mean) : Exponential, with mean 1 by default
+        - A function, f, such that f(sender, receiver) is one of the above, the
+        model of the channel from sender to receiver
+    Channels are FIFO: a Message is never delivered before one sent earlier on
+    the same channel.
     """
 
+    """While an execution runs, _enable_trans(p) enables a transition of p, and
+    _halted_processes is the set of the Processes that have halted"""
+    _enable_trans = None
+    _halted_processes = frozenset()
+
     def run(self, network, params = {}):
         Algorithm.run(self, network, params=params)
         self.execute()
 
     def execute(self):
-        halted_processes = set()
-        msg_enabled = set(self.network.processes)
-        trans_enabled = set()
+        if self.params.get('scheduler', 'random') == 'events':
+            self.execute_events()
+        else:
+            self.execute_random()
+
+    def execute_random(self):
+        """
+        Repeatedly takes an action chosen uniformly at random among the enabled
+        ones, until every Process has halted. Enabled actions are kept in
+        Random_Sets, and only the Process that took a step is checked for
+        halting, so each step costs time proportional to its degree.
+
+        A Process is enabled to perform a transition exactly when Messages are
+        waiting in its mailbox. Sending a Message wakes its receiver, so
+        Messages may be sent from both msgs_i and trans_i.
+        """
+        halted_processes = self._halted_processes = set()
+        msg_enabled = Random_Set(self.network.processes)
+        trans_enabled = Random_Set()
+        self._enable_trans = trans_enabled.add
+        takes_msgs = self._trans_takes_msgs
 
         def halt_process(process):
             halted_processes.add(process)
-            if process in msg_enabled:
-                msg_enabled.remove(process)
-            if process in trans_enabled:
-                trans_enabled.remove(process)
+            msg_enabled.discard(process)
+            trans_enabled.discard(process)
 
         def trans_process(process):
-            if process not in halted_processes:
-                try: #Checks if function trans_i(self, p) is defined
-                    self.trans_i(process)
-                except TypeError: #Otherwise, tries function trans_i(self, p, msgs)
-                    self.trans_i(process, process.get_msgs(self))
+            if takes_msgs:
+                self.trans_i(process, process.get_msgs(self))
+            else:
+                self.trans_i(process)
 
+            if not process.has_msgs(self):
                 trans_enabled.remove(process)
-                msg_enabled.add(process)
+            msg_enabled.add(process)
 
-                # Uncomment this to allow message sending during self.trans_i
-                # Warning: Causes significant slowdown
-                # for nbr in process.out_nbrs:
-                #     if nbr not in halted_processes:
-                #         trans_enabled.add(nbr)
-
-                if self.halt_i(process):
-                    halt_process(process)            
+            if self.halt_i(process):
+                halt_process(process)
 
         def msg_process(process):
-            if process not in halted_processes:
-                self.msgs_i(process)
+            self.msgs_i(process)
 
-                msg_enabled.remove(process)                
-                for nbr in process.out_nbrs:
-                    if nbr not in halted_processes:
-                        trans_enabled.add(nbr)
+            msg_enabled.remove(process)
 
-                if self.halt_i(process):
-                    halt_process(process)
+            if self.halt_i(process):
+                halt_process(process)
+
+        for process in self.network:
+            if self.halt_i(process):
+                halt_process(process)
+            elif process.has_msgs(self):
+                trans_enabled.add(process)
 
         self.halted=False
-        while not self.halted:
-            if msg_enabled or trans_enabled:
-                r = random.randrange(len(msg_enabled) + len(trans_enabled))
-                if r < len(msg_enabled):
-                    msg_process(list(msg_enabled)[r])
+        n = len(self.network)
+        try:
+            while len(halted_processes) < n:
+                if msg_enabled or trans_enabled:
+                    r = random.randrange(len(msg_enabled) + len(trans_enabled))
+                    if r < len(msg_enabled):
+                        msg_process(msg_enabled[r])
+                    else:
+                        trans_process(trans_enabled[r-len(msg_enabled)])
                 else:
-                    trans_process(list(trans_enabled)[r-len(msg_enabled)])
+                    raise Exception("No enabled actions, but not all processes halted")
+        finally:
+            del self._enable_trans, self._halted_processes
+        self._halt()
+
+    def execute_events(self):
+        """
+        Simulates the execution as a sequence of timed events, kept in a heap.
+        Local steps take no time; a Message sent at time t is delivered at time
+        t + its delay. Only scheduled events are visited, so the cost of the
+        simulation is proportional to the number of Messages sent.
+        """
+        TRANS, MSGS, DELIVER = 0, 1, 2
+        events = []
+        halted_processes = self._halted_processes = set()
+        trans_scheduled = set()
+        msgs_scheduled = set()
+        channel_delays = {}  # (receiver, port) : function that draws a delay
+        channel_clocks = {}  # (receiver, port) : time of its latest delivery
+        delay = self.params.get('delay', 'normalized')
+        takes_msgs = self._trans_takes_msgs
+        seq = [0]
+
+        def schedule(time, kind, process, payload=None):
+            seq[0] += 1
+            heapq.heappush(events, (time, seq[0], kind, process, payload))
+
+        def enable_trans(process):
+            if process not in trans_scheduled:
+                trans_scheduled.add(process)
+                schedule(self.time, TRANS, process)
+
+        def enable_msgs(process):
+            if process not in msgs_scheduled:
+                msgs_scheduled.add(process)
+                schedule(self.time, MSGS, process)
+
+        def transmit(receiver, port, msg):
+            channel = (receiver, port)
+            if channel not in channel_delays:
+                model = delay(msg.author, receiver) if callable(delay) else delay
+                channel_delays[channel] = delay_sampler(model)
+            time = max(self.time + channel_delays[channel](), channel_clocks.get(channel, 0))
+            channel_clocks[channel] = time
+            schedule(time, DELIVER, receiver, (port, msg))
+
+        self._enable_trans = enable_trans
+        self.transmit = transmit
+        self.time = 0
+        for process in self.network:
+            if self.halt_i(process):
+                halted_processes.add(process)
             else:
-                raise Exception("No enabled actions, but not all processes halted")
-            self.halt()
+                enable_msgs(process)
+                if process.has_msgs(self):
+                    enable_trans(process)
+
+        self.halted=False
+        n = len(self.network)
+        try:
+            while len(halted_processes) < n:
+                if not events:
+                    raise Exception("No enabled actions, but not all processes halted")
+                self.time, _, kind, process, payload = heapq.heappop(events)
+                if process in halted_processes:
+                    continue
+                if kind == DELIVER:
+                    port, msg = payload
+                    process.deliver(msg, port)
+                    enable_trans(process)
+                elif kind == TRANS:
+                    trans_scheduled.discard(process)
+                    if takes_msgs:
+                        self.trans_i(process, process.get_msgs(self))
+                    else:
+                        self.trans_i(process)
+                    enable_msgs(process)
+                else:
+                    msgs_scheduled.discard(process)
+                    self.msgs_i(process)
+                if self.halt_i(process):
+                    halted_processes.add(process)
+        finally:
+            del self.transmit, self._enable_trans, self._halted_processes
+        self._halt()
+
+    def wake(self, p):
+        if self._enable_trans is not None and p not in self._halted_processes:
+            self._enable_trans(p)
+
+    def print_algorithm_terminated(self):
+        if self.params.get('scheduler', 'random') != 'events':
+            return Algorithm.print_algorithm_terminated(self)
+        print self.name+" Terminated"
+        msg_complexity = "Message Complexity: " + str(self.message_count)
+        print msg_complexity
+        time_complexity = "Time Complexity: " + str(self.time)
+        print time_complexity
+        print "-"*len(time_complexity)
+
+
+def delay_sampler(model):
+    """
+    @param model: a delay model, as described in Asynchronous_Algorithm
+    @return: a function that draws a delay from model
+    """
+    if isinstance(model, (int, float)):
+        return lambda: model
+    if isinstance(model, basestring):
+        model = (model,)
+    kind, args = model[0], tuple(model[1:])
+    if kind == 'normalized':
+        return lambda: 1. - random.random()
+    if kind == 'uniform':
+        low, high = args or (0., 1.)
+        return lambda: random.uniform(low, high)
+    if kind == 'exponential':
+        mean, = args or (1.,)
+        return lambda: random.expovariate(1./mean)
+    raise Exception("Unknown delay model: "+str(model))
         
     
 class Compose(Synchronous_Algorithm):
@@ -713,8 +1677,21 @@ class Compose(Synchronous_Algorithm):
         self.message_count = self.A.message_count + self.B.message_count
         self.A.cleanup_i(p)
         self.B.cleanup_i(p)
+        p.clear_msgs(self.A)
+        p.clear_msgs(self.B)
         p.terminate(self)
 
+    def cleanup(self):
+        Synchronous_Algorithm.cleanup(self)
+        self._remove_columns(self.network.store)
+
+    def _remove_columns(self, store):
+        """Discards the columns of the composed Algorithms from store"""
+        for algorithm in (self.A, self.B):
+            store.remove(algorithm)
+            if isinstance(algorithm, Compose):
+                algorithm._remove_columns(store)
+
     def run(self, network, params = {}):
         Algorithm.run(self, network, params)
         self.network.add(self.A)
@@ -0,0 +1,150 @@
+"""
+Headless export of the history of a Network
+
+Renders snapshots of a Network through the Agg backend, so it needs no display,
+into numbered PNG frames, an animated GIF or an MP4. Used by Network.export
+
+The layout and topology of the Network are computed once, in the parent
+process, and handed to a pool of worker processes that render the frames. The
+workers only receive the colors of each frame.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from distutils.spawn import find_executable
+from multiprocessing import Pool, cpu_count
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from distalgs import draw_graph
+
+FRAME_NAME = 'frame_%05d.png'
+
+_graph = None # (vertices, edges, figsize, dpi), shared by the frames a worker renders
+
+def export(network, path, snapshots=None, workers=None, fps=5, figsize=(8, 5), dpi=100):
+    """
+    Renders snapshots of network to path
+
+    @param network: the Network whose snapshots to render
+    @param path: a directory, to write one numbered PNG per frame in, or a
+    file name ending in .gif or .mp4, to write an animation to. GIFs need
+    Pillow or ffmpeg, and MP4s need ffmpeg, which are looked for before any
+    frame is rendered.
+    @param snapshots: [Optional] the snapshots to render:
+        - None (default) renders every snapshot
+        - k, a positive int, renders every k-th snapshot, and the last one
+        - a list of the times of the snapshots to render
+    @param workers: [Optional] the number of processes that render frames.
+    Defaults to the number of CPUs. 1 renders in this process.
+    @param fps: [Optional] frames per second of an animation
+    @param figsize: [Optional] (width, height) of a frame, in inches
+    @param dpi: [Optional] resolution of a frame, in dots per inch
+    @return: the paths of the frames, or of the animation
+    """
+    times = _snapshot_times(len(network._snapshots), snapshots)
+    animation = _animation_writer(path)
+    frame_dir = tempfile.mkdtemp() if animation else path
+    if not os.path.isdir(frame_dir):
+        os.makedirs(frame_dir)
+
+    graph = (network.get_vertex_coords(), network.edges(), figsize, dpi)
+    frames = ((os.path.join(frame_dir, FRAME_NAME % i), t) + network.get_colors(t)
+              for i, t in enumerate(times))
+
+    try:
+        if workers is None:
+            workers = cpu_count()
+        if workers == 1:
+            _init_worker(graph)
+            frame_paths = map(_render_frame, frames)
+        else:
+            pool = Pool(workers, initializer=_init_worker, initargs=(graph,))
+            try:
+                frame_paths = list(pool.imap(_render_frame, frames, chunksize=4))
+            finally:
+                pool.close()
+                pool.join()
+
+        if animation is None:
+            return frame_paths
+        _write_animation(animation, frame_dir, frame_paths, path, fps)
+        return path
+    finally:
+        if animation:
+            shutil.rmtree(frame_dir, ignore_errors=True)
+
+def _snapshot_times(count, snapshots):
+    """@return: the times of the snapshots to render, out of count snapshots"""
+    if snapshots is None:
+        return range(count)
+    if isinstance(snapshots, int):
+        if snapshots <= 0:
+            raise Exception("snapshots must be a positive stride, not "+str(snapshots))
+        times = range(0, count, snapshots)
+        if times and times[-1] != count-1:
+            times.append(count-1)
+        return times
+    return [t if t >= 0 else t+count for t in snapshots]
+
+def _animation_writer(path):
+    """
+    @return: None if path is a directory of frames, else the writer of the
+    animation at path: the path of ffmpeg, or 'pillow' for a GIF when ffmpeg
+    is not installed
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.gif', '.mp4'):
+        if extension and not os.path.isdir(path):
+            raise Exception("Cannot export to "+path+": it must be a directory, or end in .gif or .mp4")
+        return None
+    ffmpeg = find_executable('ffmpeg')
+    if ffmpeg is not None:
+        return ffmpeg
+    if extension == '.mp4':
+        raise Exception("You must install ffmpeg to export an MP4")
+    try:
+        import PIL
+    except ImportError:
+        raise Exception("You must install Pillow or ffmpeg to export a GIF")
+    return 'pillow'
+
+def _init_worker(graph):
+    global _graph
+    _graph = graph
+
+def _render_frame(frame):
+    """
+    Renders one frame through Agg
+
+    @param frame: (path, t, node_colors, edge_colors)
+    @return: path
+    """
+    path, t, node_colors, edge_colors = frame
+    vertices, edges, figsize, dpi = _graph
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
+    ax.set_title("t = "+str(t))
+    draw_graph(ax, vertices, edges, node_colors, edge_colors)
+    fig.savefig(path)
+    return path
+
+def _write_animation(writer, frame_dir, frame_paths, path, fps):
+    """Assembles the numbered frames in frame_dir into the animation at path,
+    with writer, as given by _animation_writer"""
+    if writer == 'pillow':
+        from PIL import Image
+        images = [Image.open(frame_path) for frame_path in frame_paths]
+        images[0].save(path, save_all=True, append_images=images[1:],
+                       duration=int(1000./fps), loop=0)
+        return
+    command = [writer, '-y', '-loglevel', 'error', '-framerate', str(fps),
+               '-i', os.path.join(frame_dir, FRAME_NAME)]
+    if path.lower().endswith('.mp4'):
+        # yuv420p needs even dimensions
+        command += ['-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-pix_fmt', 'yuv420p']
+    subprocess.check_call(command + [path])
@@ -1,4 +1,9 @@
+import contextlib
 import functools
+import gc
+import inspect
+import random
+
 def memoize(obj):
     cache = obj.cache = {}
  
@@ -8,4 +13,95 @@ def memoize(obj):
         if key not in cache:
             cache[key] = obj(*args, **kwargs)
         return cache[key]
-    return memoizer
\ No newline at end of file
+    return memoizer
+
+def memoize_version(method):
+    """
+    Memoizes a method of an object that has a version attribute, like a Network,
+    until that version changes
+    """
+    @functools.wraps(method)
+    def memoizer(self, *args, **kwargs):
+        cache = self.__dict__.setdefault('_version_cache', {})
+        key = (method.__name__,) + args + tuple(sorted(kwargs.items()))
+        entry = cache.get(key)
+        if entry is None or entry[0] != self.version:
+            entry = cache[key] = (self.version, method(self, *args, **kwargs))
+        return entry[1]
+    return memoizer
+
+def set_memoized(obj, name, value, *args):
+    """
+    Stores value as the result of obj.name(*args), a method memoized with
+    memoize_version, until the version of obj changes
+    """
+    cache = obj.__dict__.setdefault('_version_cache', {})
+    cache[(name,) + args] = (obj.version, value)
+
+@contextlib.contextmanager
+def gc_paused():
+    """
+    Pauses the cyclic garbage collector, e.g. while building many objects
+    that are not garbage. Otherwise every few hundred of them trigger a
+    collection, and each full collection traverses every object alive.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def accepts_args(method, count):
+    """@return: True iff method can be called with count positional arguments"""
+    args, varargs, keywords, defaults = inspect.getargspec(method)
+    if inspect.ismethod(method) and method.__self__ is not None:
+        args = args[1:]
+    required = len(args) - len(defaults or ())
+    return required <= count and (varargs is not None or len(args) >= count)
+
+class Random_Set:
+    """
+    A set that can also return an element chosen uniformly at random.
+
+    Elements are kept in a list, with a dict from element to position, so
+    adding, removing, indexing and sampling all take O(1) time. Removing an
+    element moves the last element of the list into its position.
+    """
+    def __init__(self, items=()):
+        self._items = []
+        self._index = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self._index:
+            self._index[item] = len(self._items)
+            self._items.append(item)
+
+    def remove(self, item):
+        i = self._index.pop(item)
+        last = self._items.pop()
+        if i < len(self._items):
+            self._items[i] = last
+            self._index[last] = i
+
+    def discard(self, item):
+        if item in self._index:
+            self.remove(item)
+
+    def choice(self):
+        return random.choice(self._items)
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
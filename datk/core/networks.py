@@ -1,4 +1,5 @@
 from distalgs import Network
+import numpy as np
 import math
 import random
 import pdb
@@ -9,18 +10,23 @@ class Unidirectional_Ring(Network):
         only be sent in a clockwise direction."""
     def __init__(self, n, index_to_UID = None):
         Network.__init__(self, n, index_to_UID)
-        for i in range(n):
-            self[i].link_to(self[(i+1)%n])
+        i = np.arange(n)
+        self.link_edges(np.column_stack((i, (i+1)%n)))
+        self.name_ports({'right': 0})
 
 class Bidirectional_Ring(Network):
     """A Network of n Processes arranged in a ring. Each edge between a Process
         and its neighbor is undirected, that is, messages can be sent in both
-        the clockwise and the counterclockwise directions."""
+        the clockwise and the counterclockwise directions. Every Process names
+        its port to its clockwise neighbor 'right', and its port to its
+        counterclockwise neighbor 'left'."""
     def __init__(self, n, index_to_UID = None):
         Network.__init__(self, n, index_to_UID)
-        for i in range(n):
-            self[i].link_to(self[(i+1)%n])
-            self[i].link_to(self[(i-1)%n])
+        i = np.arange(n)
+        self.link_edges(np.column_stack((i, (i+1)%n, i, (i-1)%n)))
+        # The clockwise neighbor is on out-port 0, and, unless it is also the
+        # counterclockwise one, the counterclockwise neighbor on out-port 1
+        self.name_ports({'right': 0, 'left': 1 if n > 2 else 0})
 
 class Unidirectional_Line(Network):
     """A Network of n Processes arranged in a line. Each edge is directed
@@ -28,8 +34,9 @@ class Unidirectional_Line(Network):
         only be sent in a clockwise direction."""
     def __init__(self, n, index_to_UID = None):
         Network.__init__(self, n, index_to_UID)
-        for i in range(n-1):
-            self[i].link_to(self[(i+1)])
+        i = np.arange(n-1)
+        self.link_edges(np.column_stack((i, i+1)))
+        self.name_ports({'right': 0}, range(n-1))
 
 class Bidirectional_Line(Network):
     """A Network of n Processes arranged in a line. Each edge between a Process
@@ -37,17 +44,20 @@ class Bidirectional_Line(Network):
         the clockwise and the counterclockwise directions."""
     def __init__(self, n, index_to_UID = None):
         Network.__init__(self, n, index_to_UID)
-        for i in range(n-1):
-            self[i].bi_link(self[(i+1)])
+        i = np.arange(n-1)
+        self.link_edges(np.column_stack((i, i+1)), bidirectional=True)
+        # Every Process links to its left neighbor before its right one
+        if n > 1:
+            self.name_ports({'right': 0}, [0])
+            self.name_ports({'left': 0, 'right': 1}, range(1, n-1))
+            self.name_ports({'left': 0}, [n-1])
 
 class Complete_Graph(Network):
     """A Network of n Processes arranged at the vertices of a Complete undirected
     graph of size n."""
     def __init__(self, n, index_to_UID = None):
         Network.__init__(self, n, index_to_UID)
-        for i in range(n-1):
-            for j in range(i+1,n):
-                self[i].bi_link(self[j])
+        self.link_edges(np.column_stack(np.triu_indices(n, 1)), bidirectional=True)
         self.arrange_nodes = 'circular'
 
 class Random_Line_Network(Network):
@@ -70,8 +80,10 @@ class Random_Line_Network(Network):
             if t < -100: return 0.
             return 1./(1.+math.exp(-t))
 
+        edges = []
         for i in range(n-1):
-            self[i].bi_link(self[(i+1)])
+            edges.append((i, i+1))
             for j in range(i+2, n):
                 if random.random() < sigmoid( -((i-j)**2)/(float(n)**0.5)*sparsity)  *2.:
-                    self[i].bi_link(self[j])
+                    edges.append((i, j))
+        self.link_edges(edges, bidirectional=True)
@@ -23,23 +23,9 @@ class Canvas():
         """
         Draws the network
         """
-        def setup():
-            self.setup_fig()
-
-        def e_draw(edge, color=Color.black):
-            color = color.toMpl()
-            start, end = edge
-            self.ax.plot( (start[0], end[0]), (start[1], end[1]), color)
-            
-        def v_draw(vertex, process, color=Color.black):
-            color = color.toMpl()+'o'
-            x,y = vertex
-            self.ax.plot( [x], [y], color)
-
-        def show():
-            self.fig.show()
-
-        self.network.general_draw(v_draw, e_draw, setup=setup, show=show)
+        self.setup_fig()
+        self.network.draw_on(self.ax)
+        self.fig.show()
 
 def draw(network):
     Canvas(network)
@@ -3,7 +3,7 @@ from PyQt4.QtGui import (QMainWindow, QWidget, QApplication, QVBoxLayout,
      QSlider, QHBoxLayout, QPushButton, QGraphicsLineItem, QGraphicsScene, 
      QGraphicsEllipseItem, QGraphicsView, QBrush, QColor, QPen)
 from PyQt4.QtCore import QPointF, Qt, SIGNAL
-from colorizer import Color
+from colorizer import Color, Color_Cache
 from distalgs import Algorithm
 
 
@@ -23,6 +23,15 @@ class Canvas(QGraphicsView):
        border-radius: 3px;
       }
       """)
+
+      self.network = None
+      self.version = None
+      self.t = None
+      self.unit = None      # pixels per unit of the layout
+      self.node_items = []  # index : Node_Item
+      self.edge_items = {}  # frozenset of the indices of its ends : QGraphicsLineItem
+      self.node_colors = [] # index : Color
+      self.edge_colors = {} # frozenset of the indices of its ends : Color, if not black
    
    @staticmethod
    def line(scene, x1, y1, x2, y2, color="blue", width=5):
@@ -31,55 +40,116 @@ class Canvas(QGraphicsView):
       pen.setWidth(width)
       item.setPen(pen)
       scene.addItem(item)
+      return item
 
    @staticmethod
-   def point(scene, x, y, color='black', fill='black', diam=10, toolTip=None):
-      item = QGraphicsEllipseItem(x-diam/2, y-diam/2, diam, diam)
-      brush = QBrush(QColor(color), style=Qt.SolidPattern)
-      item.setBrush(brush)
-      if toolTip:
-         item.setToolTip(toolTip)
-      scene.addItem(item)
-
-   def draw(self, network):
+   def tooltip(process):
+      """@return: an HTML table of the state of process"""
+      tr = lambda col1,col2:'<tr><td>'+str(col1)+'</td><td>'+str(col2)+'</td></tr>'
+      table_open = '<table border="1" cellspacing="0" cellpadding="5" style="border-color:black; border-style:solid; padding:0;">'
+      table_close = '</table>'
+
+      toolTip = '<b>' + str(process) + ':</b>'
+      toolTip+=table_open
+      for key, val in process.state.items():
+         if not isinstance(key, Algorithm):
+            toolTip+=tr(key, val)
+      toolTip+=table_close
+
+      for key, val in process.state.items():
+         if isinstance(key, Algorithm):
+            toolTip+='<p><i>'+str(key)+'</i></p>'
+            toolTip+=table_open
+            for k, v in val.items():
+               toolTip+=tr(k, v)
+            toolTip+=table_close
+      return toolTip
+
+   def process(self, i):
+      """@return: Process self.network[i], as it was at the snapshot drawn"""
+      if self.t is None:
+         return self.network[i]
+      return self.network.view(self.t)[i]
+
+   def create_items(self, network):
+      """Creates a black point for every Process and a line for every edge"""
       scene = QGraphicsScene(self)
-      SCALE = min(self.size().width(), self.size().height())
-
-      def v_draw(vertex, process, color=Color.black):
-         x, y = vertex
-         color = color.toQt()
-
-         tr = lambda col1,col2:'<tr><td>'+str(col1)+'</td><td>'+str(col2)+'</td></tr>'
-         table_open = '<table border="1" cellspacing="0" cellpadding="5" style="border-color:black; border-style:solid; padding:0;">'
-         table_close = '</table>'
-
-         toolTip = '<b>' + str(process) + ':</b>'
-         toolTip+=table_open
-         for key, val in process.state.items():
-            if not isinstance(key, Algorithm):
-               toolTip+=tr(key, val)
-         toolTip+=table_close
-
-         for key, val in process.state.items():
-            if isinstance(key, Algorithm):
-               toolTip+='<p><i>'+str(key)+'</i></p>'
-               toolTip+=table_open
-               for k, v in val.items():
-                  toolTip+=tr(k, v)
-               toolTip+=table_close
-
-         Canvas.point(scene, x*SCALE, y*SCALE, color=color, fill=color, toolTip=toolTip)
-
-      def e_draw(edge, color=Color.black):
-         start, end = edge
-         color = color.toQt()
-         x1,y1 = start
-         x2,y2 = end
-         Canvas.line(scene, x1*SCALE, y1*SCALE, x2*SCALE, y2*SCALE, color=color)
-
-      network.general_draw(v_draw, e_draw)
-      
       self.setScene(scene)
+      self.unit = min(self.size().width(), self.size().height())
+      self.network = network
+      self.version = network.version
+      vertices = network.get_vertex_coords()
+
+      self.edge_items = {}
+      for i, p in enumerate(network):
+         for nbr in p.out_nbrs:
+            self.edge_item(frozenset((i, network.index(nbr))))
+
+      self.node_items = []
+      for i, (x, y) in enumerate(vertices):
+         item = Node_Item(self, i, x*self.unit, y*self.unit)
+         item.setBrush(QBrush(QColor(Color.black.toQt()), style=Qt.SolidPattern))
+         scene.addItem(item)
+         self.node_items.append(item)
+
+      self.node_colors = [Color.black]*len(network)
+      self.edge_colors = {}
+
+   def edge_item(self, key):
+      """@return: the line between the Processes at the indices in frozenset
+      key, created if needed"""
+      if key not in self.edge_items:
+         ends = sorted(key)
+         (x1, y1), (x2, y2) = self.network.get_vertex_coords()[[ends[0], ends[-1]]]
+         item = Canvas.line(self.scene(), x1*self.unit, y1*self.unit,
+            x2*self.unit, y2*self.unit, color=Color.black.toQt())
+         item.setZValue(-1) # Below the points
+         self.edge_items[key] = item
+      return self.edge_items[key]
+
+   def draw(self, network, t=None, colors=None):
+      """
+      Draws the network. The graphics items are created once per topology;
+      drawing another snapshot only recolors the nodes and edges whose color
+      changed.
+
+      @param t: [Optional] draws the network as it was at snapshot t
+      @param colors: [Optional] network.get_colors(t), if it is already known
+      """
+      if network is not self.network or network.version != self.version:
+         self.create_items(network)
+      self.t = t
+
+      node_colors, edge_colors = colors or network.get_colors(t)
+      edge_colors = {frozenset(edge): color for edge, color in edge_colors.iteritems()}
+      for item, old, new in zip(self.node_items, self.node_colors, node_colors):
+         if old != new:
+            item.setBrush(QBrush(QColor(new.toQt()), style=Qt.SolidPattern))
+      for edge in set(self.edge_colors) | set(edge_colors):
+         old = self.edge_colors.get(edge, Color.black)
+         new = edge_colors.get(edge, Color.black)
+         if old != new:
+            item = self.edge_item(edge)
+            pen = item.pen()
+            pen.setColor(QColor(new.toQt()))
+            item.setPen(pen)
+      self.node_colors, self.edge_colors = node_colors, edge_colors
+
+
+class Node_Item(QGraphicsEllipseItem):
+   """
+   The point drawn for a Process. Its tooltip, a table of the state of the
+   Process at the snapshot drawn, is only built when the mouse hovers over it.
+   """
+   def __init__(self, canvas, i, x, y, diam=10):
+      super(Node_Item, self).__init__(x-diam/2, y-diam/2, diam, diam)
+      self.canvas = canvas
+      self.i = i
+      self.setAcceptHoverEvents(True)
+
+   def hoverEnterEvent(self, event):
+      self.setToolTip(Canvas.tooltip(self.canvas.process(self.i)))
+      super(Node_Item, self).hoverEnterEvent(event)
 
 
 class Simulator(QMainWindow):
@@ -91,6 +161,7 @@ class Simulator(QMainWindow):
 
       # Network
       self.network = network
+      self.colors = Color_Cache(network) # Prefetches colors around the slider
 
       # Canvas
       self.canvas = Canvas()
@@ -127,8 +198,7 @@ class Simulator(QMainWindow):
 
 
    def draw_network(self, value):
-      self.network.restore_snapshot(value)
-      self.canvas.draw(self.network)
+      self.canvas.draw(self.network, value, self.colors.get(value))
 
    def onClickPrev(self):
       v = self.slider.value()
@@ -141,7 +211,7 @@ class Simulator(QMainWindow):
          self.slider.setValue(v+1)
 
    def closeEvent(self, event): 
-      self.network.restore_snapshot(-1)
+      self.colors.close()
       self.deleteLater() 
 
 
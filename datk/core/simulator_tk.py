@@ -6,7 +6,7 @@ Tk based GUI. Used by Network.start_simulation
 import Tkinter as tk
 from Tkinter import Tk, Scale, ALL, HORIZONTAL, CURRENT, Label, Toplevel
 from ttk import Scale, Treeview
-from colorizer import Color
+from colorizer import Color, Color_Cache
 from distalgs import Algorithm
 
 class Simulator(Tk):
@@ -16,9 +16,9 @@ class Simulator(Tk):
 
         self.network = network
         self.n_steps = network.count_snapshots()
-        self.network.restore_snapshot(0)
+        self.colors = Color_Cache(network) # Prefetches colors around the slider
         self.canvas = Canvas(self, width=800, height=500)
-        self.canvas.draw(self.network)
+        self.canvas.draw(self.network, 0, self.colors.get(0))
         self.canvas.pack()
 
         self.slider = Scale(self, from_=0, to=self.n_steps-1, length=300,
@@ -26,22 +26,36 @@ class Simulator(Tk):
         self.slider.pack(padx=10, pady=10)
     
     def updateValue(self, val):
-        self.network.restore_snapshot(int(float(val)))
-        self.canvas.draw(self.network)
-    
+        t = int(float(val))
+        self.canvas.draw(self.network, t, self.colors.get(t))
+
     def destroy(self):
-        self.network.restore_snapshot(-1)
+        self.colors.close()
         Tk.destroy(self)
 
 class Canvas(tk.Canvas):
+    """
+    Draws a Network. The graphics items are created once per topology; drawing
+    another snapshot only recolors the nodes and edges whose color changed.
+    """
+    SCALE = 250
+
     def __init__(self, root, width=300, height=300):
         tk.Canvas.__init__(self, root, width=width, height=height)
         self.width = width
         self.height = height
         self.pack()
-        self.graphicsItem2Process = {} #GraphicsItem id : process
+        self.graphicsItem2Process = {} #GraphicsItem id : process index
         self.register_click_listener()
         self.tt = None #ToolTip
+
+        self.network = None
+        self.version = None
+        self.t = None
+        self.node_items = []  # index : oval id
+        self.edge_items = {}  # frozenset of the indices of its ends : line id
+        self.node_colors = [] # index : Color
+        self.edge_colors = {} # frozenset of the indices of its ends : Color, if not black
     
     def register_click_listener(self):
         def onclick(event):
@@ -51,46 +65,80 @@ class Canvas(tk.Canvas):
             if self.find_withtag(CURRENT): #Shows a tooltip
                 item = self.find_withtag(CURRENT)[0]
                 if item in self.graphicsItem2Process:
-                    p = self.graphicsItem2Process[item]
-                    text = "UID: "+str(p.UID)
-                    self.tt = ToolTip(self, p, event.x, event.y)
+                    self.tt = ToolTip(self, self.process(self.graphicsItem2Process[item]),
+                                      event.x, event.y)
 
         self.bind("<Button-1>", onclick)
 
-    def draw(self, network):
-
-        SCALE = 250
-
-        def scale(v):
-            x, y = v
-            x *= SCALE
-            y *= SCALE
-            x += self.width/2
-            y += self.height/2
-            return x, y
-
-        def v_draw(vertex, process, color=Color.black, radius=5):
-            x,y = scale(vertex)
-            color = color.toTk()
-            item_id = self.create_oval(
-                x-radius,
-                y-radius,
-                x+radius,
-                y+radius,
-                fill=color
-            )
-            self.graphicsItem2Process[item_id] = process
-
-        def e_draw(edge, color=Color.black):
-            start, end = edge
-            start, end = scale(start), scale(end)
-            x1,y1 = start
-            x2,y2 = end
-            color = color.toTk()
-            self.create_line(x1, y1, x2, y2, fill=color)
+    def process(self, i):
+        """@return: Process self.network[i], as it was at the snapshot drawn"""
+        if self.t is None:
+            return self.network[i]
+        return self.network.view(self.t)[i]
+
+    def scale(self, v):
+        x, y = v
+        return x*Canvas.SCALE + self.width/2, y*Canvas.SCALE + self.height/2
 
+    def create_items(self, network):
+        """Creates a black oval for every Process and a line for every edge"""
+        radius = 5
         self.delete(ALL)
-        network.general_draw(v_draw, e_draw)
+        self.graphicsItem2Process = {}
+        self.network = network
+        self.version = network.version
+        vertices = network.get_vertex_coords()
+
+        self.edge_items = {}
+        for i, p in enumerate(network):
+            for nbr in p.out_nbrs:
+                self.edge_item(frozenset((i, network.index(nbr))))
+
+        self.node_items = []
+        for i, vertex in enumerate(vertices):
+            x, y = self.scale(vertex)
+            item_id = self.create_oval(x-radius, y-radius, x+radius, y+radius,
+                                       fill=Color.black.toTk())
+            self.node_items.append(item_id)
+            self.graphicsItem2Process[item_id] = i
+
+        self.node_colors = [Color.black]*len(network)
+        self.edge_colors = {}
+
+    def edge_item(self, key):
+        """@return: the id of the line between the Processes at the indices in
+        frozenset key, created if needed"""
+        if key not in self.edge_items:
+            ends = sorted(key)
+            i, j = ends[0], ends[-1]
+            vertices = self.network.get_vertex_coords()
+            (x1, y1), (x2, y2) = self.scale(vertices[i]), self.scale(vertices[j])
+            self.edge_items[key] = self.create_line(x1, y1, x2, y2, fill=Color.black.toTk())
+            self.tag_lower(self.edge_items[key])
+        return self.edge_items[key]
+
+    def draw(self, network, t=None, colors=None):
+        """
+        Draws the network
+
+        @param t: [Optional] draws the network as it was at snapshot t
+        @param colors: [Optional] network.get_colors(t), if it is already known
+        """
+        if network is not self.network or network.version != self.version:
+            self.create_items(network)
+        self.t = t
+
+        node_colors, edge_colors = colors or network.get_colors(t)
+        edge_colors = {frozenset(edge): color for edge, color in edge_colors.iteritems()}
+        for item_id, old, new in zip(self.node_items, self.node_colors, node_colors):
+            if old != new:
+                self.itemconfig(item_id, fill=new.toTk())
+        for edge in set(self.edge_colors) | set(edge_colors):
+            old = self.edge_colors.get(edge, Color.black)
+            new = edge_colors.get(edge, Color.black)
+            if old != new:
+                self.itemconfig(self.edge_item(edge), fill=new.toTk())
+        self.node_colors, self.edge_colors = node_colors, edge_colors
 
 class ToolTip(Toplevel):
     def __init__(self, parent, process, x, y):
@@ -0,0 +1,226 @@
+"""
+Snapshot journal
+
+Records the state of every Process in a Network over the course of an
+execution. Each snapshot stores only the state that changed since the previous
+one, and every KEYFRAME_INTERVAL snapshots a full keyframe is kept, so that any
+snapshot can be rebuilt from the nearest keyframe before it.
+
+Snapshots are read through read-only views, so that history can be inspected
+without touching the live state of the Processes.
+"""
+from collections import Mapping
+import numpy as np
+from columns import object_column
+
+class State_View(Mapping):
+    """A read-only view of the state of a Process at some snapshot.
+
+    Like Process.state, a key that is missing reads as {}
+    """
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, key):
+        try:
+            return self._state[key]
+        except KeyError:
+            return {}
+
+    def __contains__(self, key):
+        return key in self._state
+
+    def get(self, key, default=None):
+        return self._state.get(key, default)
+
+    def __iter__(self):
+        return iter(self._state)
+
+    def __len__(self):
+        return len(self._state)
+
+    def __repr__(self):
+        return repr(self._state)
+
+
+class Process_View(object):
+    """A Process as it was at some snapshot. Its state is read from the
+    snapshot, and everything else from the Process itself."""
+    def __init__(self, process, state):
+        self.process = process
+        self.state = State_View(state)
+
+    def __getattr__(self, name):
+        return getattr(self.process, name)
+
+    def __str__(self):
+        return str(self.process)
+
+    def __repr__(self):
+        return repr(self.process)
+
+
+class Network_View(object):
+    """A read-only view of a Network at some snapshot"""
+    def __init__(self, network, states):
+        self.network = network
+        self.processes = [Process_View(p, state) for p, state in zip(network, states)]
+
+    def __getattr__(self, name):
+        return getattr(self.network, name)
+
+    def __getitem__(self, i):
+        return self.processes[i]
+
+    def column(self, key):
+        """@return: read-only numpy array of the value of key in the public
+        state of every Process at the snapshot, ordered by index, None where it
+        is missing"""
+        values = object_column([p.state.get(key) for p in self.processes])
+        values.flags.writeable = False
+        return values
+
+    def __len__(self):
+        return len(self.processes)
+
+    def __iter__(self):
+        return iter(self.processes)
+
+
+class Snapshot_Journal:
+    """
+    The history of the states of the Processes of a Network.
+
+    Snapshot t is stored as a delta, {index: (changed items, removed keys)},
+    against snapshot t-1, or as a keyframe, a full list of states, if t is a
+    multiple of keyframe_interval. State dicts are never modified once they are
+    recorded; a Process whose state changes gets a new dict, so keyframes and
+    rebuilt snapshots can share the dicts of unchanged Processes.
+    """
+    KEYFRAME_INTERVAL = 64
+
+    def __init__(self, keyframe_interval=None):
+        """
+        @param keyframe_interval: [Optional] the number of snapshots between
+        consecutive keyframes. Defaults to KEYFRAME_INTERVAL.
+        """
+        self.keyframe_interval = keyframe_interval or Snapshot_Journal.KEYFRAME_INTERVAL
+        self._keyframes = {}   # t : list of state dicts
+        self._deltas = []      # t : {index : (changed, removed)}, or None at keyframes
+        self._latest = []      # the state dicts of the most recent snapshot
+        self._cache = None     # (t, list of state dicts) of the last snapshot rebuilt
+
+    def record(self, states, indices=None, keys=None):
+        """
+        Appends a snapshot
+
+        @param states: the current state of every Process, ordered by index
+        @param indices: [Optional] the indices of the only Processes whose state
+        may have changed since the previous snapshot. Defaults to all of them.
+        @param keys: [Optional] the only state keys to record. The other keys
+        keep the values they had in the previous snapshot. Defaults to all keys.
+        """
+        t = len(self._deltas)
+        if len(self._latest) != len(states):
+            self._latest = [{}]*len(states)
+            indices = None
+        if indices is None:
+            indices = xrange(len(states))
+
+        delta = {}
+        for i in indices:
+            change = _diff(self._latest[i], states[i], keys)
+            if change is not None:
+                delta[i] = change
+                self._latest[i] = _apply(self._latest[i], change)
+
+        if t % self.keyframe_interval == 0:
+            self._keyframes[t] = list(self._latest)
+            self._deltas.append(None)
+        else:
+            self._deltas.append(delta)
+
+    def states(self, t):
+        """
+        Rebuilds snapshot t from the nearest keyframe at or before it.
+
+        @return: a list of the state dicts of all Processes, ordered by index.
+        These are shared with the journal and must not be modified.
+        """
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("No snapshot at time "+str(t))
+
+        start = t - t % self.keyframe_interval
+        cache = self._cache # Read once, since another thread may replace it
+        if cache is not None and start <= cache[0] <= t:
+            start, states = cache[0], list(cache[1])
+        else:
+            states = list(self._keyframes[start])
+        for u in xrange(start+1, t+1):
+            for i, change in self._deltas[u].iteritems():
+                states[i] = _apply(states[i], change)
+
+        self._cache = (t, states)
+        return states
+
+    def __getitem__(self, t):
+        """@return: a list of read-only State_Views of all Processes at snapshot t"""
+        if isinstance(t, slice):
+            return [self[u] for u in xrange(*t.indices(len(self)))]
+        return [State_View(state) for state in self.states(t)]
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def __iter__(self):
+        for t in xrange(len(self)):
+            yield self[t]
+
+    def __eq__(self, other):
+        return self[:] == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _diff(old, new, keys=None):
+    """
+    @return: (changed, removed), the items of state dict new that differ from
+    those of old, and the keys of old missing from new. None if there are none.
+    If keys is not None, only those keys are compared.
+
+    Dict values, like the state of an Algorithm, are copied, since they may be
+    modified in place after they are recorded.
+    """
+    if keys is not None:
+        new = {key: new[key] for key in keys if key in new}
+        old = {key: old[key] for key in keys if key in old}
+    changed = {}
+    for key, val in new.iteritems():
+        if key in old:
+            old_val = old[key]
+            if old_val is val or (type(old_val) is type(val) and _equal(old_val, val)):
+                continue
+        if isinstance(val, dict):
+            val = dict(val)
+        changed[key] = val
+    removed = [key for key in old if key not in new]
+    if changed or removed:
+        return changed, removed
+
+def _equal(a, b):
+    """@return: True iff a == b is plainly true. Comparisons that are not a
+    single bool, like those of numpy arrays, count as unequal."""
+    equal = a == b
+    return isinstance(equal, (bool, np.bool_)) and bool(equal)
+
+def _apply(state, change):
+    """@return: a new state dict, state with change applied"""
+    changed, removed = change
+    state = dict(state)
+    state.update(changed)
+    for key in removed:
+        del state[key]
+    return state
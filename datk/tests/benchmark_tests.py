@@ -0,0 +1,61 @@
+"""
+Benchmark Test Suite
+
+Tests the sampling of algorithm complexity defined in benchmark.py
+"""
+import matplotlib.pyplot as plt
+plt.switch_backend('Agg')
+from nose.tools import timed
+
+from datk.core.networks import Unidirectional_Ring
+from datk.core.algs import LCR
+from datk.core.benchmark import sample, benchmark, linear_sizes, Result_Cache
+
+from helpers import assertLeaderElection
+
+@timed(1)
+def test_sample_workers():
+    serial = sample(LCR, Unidirectional_Ring, assertLeaderElection, sizes=[2, 4, 8], seed=1)
+    parallel = sample(LCR, Unidirectional_Ring, assertLeaderElection, sizes=[2, 4, 8], workers=2, seed=1)
+    assert serial == parallel
+
+def Fixed_Unidirectional_Ring(n):
+    return Unidirectional_Ring(n, index_to_UID=lambda i: i)
+
+@timed(1)
+def test_sample_adaptive():
+    size, comm, time = sample(LCR, Fixed_Unidirectional_Ring, assertLeaderElection, sizes=[2, 4, 8])
+    assert len(size) == len(set(size)), "Deterministic trials must run once"
+    size, comm, time = sample(LCR, Unidirectional_Ring, assertLeaderElection, sizes=[2, 4, 8], max_trials=5)
+    assert all(3 <= size.count(n) <= 5 for n in set(size))
+
+def Slow_Unidirectional_Ring(n):
+    if n > 4:
+        from time import sleep
+        sleep(2)
+    return Unidirectional_Ring(n)
+
+@timed(1)
+def test_sample_limits():
+    censored = []
+    size, comm, time = sample(LCR, Slow_Unidirectional_Ring, assertLeaderElection,
+        sizes=linear_sizes(2, 10, 2), max_trials=3, trial_timeout=0.2, censored=censored)
+    assert sorted(set(size)) == [2, 4]
+    assert censored == [(6, 'time')]
+
+@timed(1)
+def test_sample_cache():
+    import shutil, tempfile
+    cache = tempfile.mkdtemp()
+    try:
+        first = sample(LCR, Unidirectional_Ring, assertLeaderElection, sizes=[2, 4], cache=cache)
+        stored = len(Result_Cache(cache, LCR, Unidirectional_Ring))
+        assert stored == len(first[0])
+
+        resumed = sample(LCR, Unidirectional_Ring, assertLeaderElection, sizes=[2, 4, 8], cache=cache)
+        assert resumed[0][:stored] == first[0] and resumed[1][:stored] == first[1]
+        assert len(Result_Cache(cache, LCR, Unidirectional_Ring)) == len(resumed[0])
+
+        benchmark(LCR, Unidirectional_Ring, assertLeaderElection, cache=cache, cached_only=True)
+    finally:
+        shutil.rmtree(cache)
@@ -4,15 +4,23 @@ Helper functions for tests in tests.py
 from datk.core.distalgs import Process
 from datk.core.networks import Random_Line_Network
 
-def assertLeaderElection(
-    network,
-    isLeader = lambda p: "status" in p.state and p.state["status"]=="leader",
-    isNonleader = lambda p: "status" in p.state and p.state["status"]=="non-leader"
-    ):
-    """Asserts that exactly one Process is Leader, and all other processes are Non-Leader"""
+def assertLeaderElection(network, isLeader = None, isNonleader = None):
+    """Asserts that exactly one Process is Leader, and all other processes are Non-Leader
 
-    assert sum([isLeader(p) for p in network]) == 1 , "Leader Election Failed"
-    assert sum([isNonleader(p) for p in network]) == len(network)-1, "Leader Election Failed"
+    If neither predicate is given, reads state['status'] of all Processes at once"""
+    if isLeader is None and isNonleader is None:
+        status = network.column('status')
+        leaders, non_leaders = (status == "leader").sum(), (status == "non-leader").sum()
+    else:
+        if isLeader is None:
+            isLeader = lambda p: "status" in p.state and p.state["status"]=="leader"
+        if isNonleader is None:
+            isNonleader = lambda p: "status" in p.state and p.state["status"]=="non-leader"
+        leaders = sum([isLeader(p) for p in network])
+        non_leaders = sum([isNonleader(p) for p in network])
+
+    assert leaders == 1 , "Leader Election Failed"
+    assert non_leaders == len(network)-1, "Leader Election Failed"
 
 def assertBroadcast(network, attr):
     """Asserts that p.state[attr] is identical for all processes p"""
@@ -52,13 +60,15 @@ def assertBFSWithChildren(network):
 def assertLubyMIS(network):
     """Asserts that every process knows a boolean value, 'MIS', and that the Processes
     where 'MIS' is True form a set that is both independent and maximal."""
-    for process in network:
-        assert 'MIS' in process.state, "'MIS' not in Process state"
-        assert isinstance(process.state['MIS'], bool)
-        if process.state['MIS'] == True:
-            assert not any([nbr.state['MIS'] for nbr in process.out_nbrs]), 'MIS not independent'
-        if process.state['MIS'] == False:
-            assert any([nbr.state['MIS'] for nbr in process.out_nbrs]), 'MIS not maximal'
+    MIS = network.column('MIS')
+    assert all(isinstance(val, bool) for val in MIS), "'MIS' not in Process state"
+    MIS = MIS.astype(bool)
+    for i, process in enumerate(network):
+        nbrs = [network.index(nbr) for nbr in process.out_nbrs]
+        if MIS[i]:
+            assert not MIS[nbrs].any(), 'MIS not independent'
+        else:
+            assert MIS[nbrs].any(), 'MIS not maximal'
 
 def Artificial_LE_Network(n):
     x = Random_Line_Network(n)
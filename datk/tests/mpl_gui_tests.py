@@ -39,4 +39,58 @@ def test_network_draw_mpl():
     from datk.core.simulator_mpl import draw
     x = Unidirectional_Ring(6)
     LCR(x)
-    draw(x)
\ No newline at end of file
+    draw(x)
+
+def test_network_get_colors():
+    x = Artificial_LE_Network(8)
+    SynchBFS(x)
+    node_colors, edge_colors = x.get_colors(0)
+    assert len(node_colors) == len(x) and not edge_colors
+    node_colors, edge_colors = x.get_colors()
+    assert len(edge_colors) == len(x)-1
+    for (i, j), color in edge_colors.iteritems():
+        assert x[i].state['parent'] is x[j]
+
+def test_network_draw_on():
+    x = Artificial_LE_Network(8)
+    SynchBFS(x)
+    ax = plt.figure().add_subplot(111)
+    edges, points = x.draw_on(ax)
+    assert len(edges.get_segments()) == x.csr().nnz/2 + len(x)-1
+    assert len(points.get_offsets()) == len(x)
+    assert len(ax.lines) == 0
+
+def test_network_export():
+    import os, shutil, tempfile
+    x = Unidirectional_Ring(6)
+    LCR(x)
+    frame_dir = tempfile.mkdtemp()
+    try:
+        frames = x.export(frame_dir, snapshots=2, workers=2)
+        assert len(frames) == len(range(0, len(x._snapshots), 2)) + 1
+        assert all(os.path.getsize(frame) > 0 for frame in frames)
+    finally:
+        shutil.rmtree(frame_dir)
+
+def test_network_export_checks_writer():
+    import os, shutil, tempfile
+    from datk.core import export
+    x = Unidirectional_Ring(6)
+    LCR(x)
+    def render(frame):
+        raise AssertionError("Rendered a frame before checking the writer")
+    find_executable, render_frame = export.find_executable, export._render_frame
+    export.find_executable, export._render_frame = lambda name: None, render
+    out_dir = tempfile.mkdtemp()
+    try:
+        for path in ['history.avi', 'history.mp4']:
+            path = os.path.join(out_dir, path)
+            try:
+                x.export(path, workers=1)
+            except Exception as e:
+                assert not isinstance(e, AssertionError) and not os.path.exists(path)
+            else:
+                assert False, "Exporting to "+path+" must fail"
+    finally:
+        export.find_executable, export._render_frame = find_executable, render_frame
+        shutil.rmtree(out_dir)
@@ -0,0 +1,351 @@
+"""
+Performance Benchmark Suite
+
+Measures the wall time, peak memory and message throughput of the engine and
+of every algorithm in algs.py, and writes the results as JSON, so that runs
+on different commits can be compared.
+
+    - Microbenchmarks time the primitives of the engine: send_msg, get_msgs,
+    save_snapshot, Network construction and layout.
+    - Macrobenchmarks run every algorithm on the topologies it supports, at
+    several sizes. Only the algorithm is timed; the algorithms it requires,
+    e.g. SynchFloodMax before SynchBFS, run beforehand.
+
+Every benchmark runs in its own process, so that its peak memory is its own.
+Memory benchmarks build a Network and run an Algorithm on it, and report the
+growth of peak memory per Process, in bytes_per_node.
+
+Usage:
+    python -m datk.tests.perf [-o results.json] [--quick] [-k substring]
+    python -m datk.tests.perf --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import multiprocessing
+from timeit import default_timer as clock
+
+from datk.core.distalgs import *
+from datk.core.networks import *
+from datk.core.algs import *
+
+PARAMS = {'draw': False, 'verbosity': Algorithm.SILENT}
+TIMEOUT = 3600 # Seconds after which a benchmark is killed
+
+# Microbenchmarks
+# Each takes n, and returns (setup, work). work() is timed, and returns the
+# number of operations it performed.
+
+def micro_send_msg(n):
+    def setup():
+        x = Bidirectional_Ring(n)
+        return x, LCR()
+    def work(state):
+        x, A = state
+        for p in x:
+            p.send_msg(Message(A, 1))
+        return len(x)
+    return setup, work
+
+def micro_get_msgs(n):
+    def setup():
+        x = Bidirectional_Ring(n)
+        A = LCR()
+        for p in x:
+            p.send_msg(Message(A, 1))
+        return x, A
+    def work(state):
+        x, A = state
+        for p in x:
+            p.get_msgs(A)
+        return len(x)
+    return setup, work
+
+def micro_save_snapshot(n):
+    def setup():
+        x = Bidirectional_Ring(n)
+        for p in x:
+            p.state['value'] = 0
+        return x
+    def work(x):
+        for t in range(10):
+            for p in x[:len(x)/10]:
+                p.state['value'] = t
+            x.save_snapshot()
+        return 10
+    return setup, work
+
+def micro_network(Network_):
+    def micro(n):
+        def work(state):
+            Network_(n)
+            return 1
+        return (lambda: None), work
+    micro.__name__ = 'micro_'+Network_.__name__
+    return micro
+
+def micro_layout(n):
+    def setup():
+        return Bidirectional_Ring(n)
+    def work(x):
+        x.get_vertex_coords('spectral')
+        return 1
+    return setup, work
+
+MICRO = [
+    (micro_send_msg, [1000, 10000]),
+    (micro_get_msgs, [1000, 10000]),
+    (micro_save_snapshot, [1000, 10000]),
+    (micro_network(Bidirectional_Ring), [1000, 10000]),
+    (micro_network(Random_Line_Network), [100, 1000]),
+    (micro_network(Complete_Graph), [100, 1000]),
+    (micro_layout, [100, 1000, 10000]),
+]
+
+# Macrobenchmarks
+# Each entry is (Algorithm_, Network_, prepare, params, sizes). prepare(x)
+# establishes what Algorithm_ requires of x, and is not timed.
+
+def leader(x):
+    SynchFloodMax(x, PARAMS)
+
+def array_leader(x):
+    ArrayFloodMax(x, PARAMS)
+
+def bfs_tree(x):
+    leader(x)
+    SynchBFS(x, PARAMS)
+
+def bfs_tree_with_children(x):
+    leader(x)
+    SynchBFSAck(x, PARAMS)
+
+def tree_height(x):
+    bfs_tree_with_children(x)
+    SynchConvergeHeight(x, PARAMS)
+
+def edge_weights(x):
+    for p in x:
+        p.state['nbr_dist'] = {}
+    for p in x:
+        for q in p.out_nbrs:
+            if p.UID not in q.state['nbr_dist']:
+                p.state['nbr_dist'][q.UID] = random.randint(0, len(x))
+            else:
+                p.state['nbr_dist'][q.UID] = q.state['nbr_dist'][p.UID]
+
+def nothing(x):
+    pass
+
+Broadcast_Height = dict(PARAMS, attr='height')
+
+MACRO = [
+    (LCR, Unidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (LCR, Bidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (AsyncLCR, Unidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (AsyncLCR, Unidirectional_Ring, nothing, dict(PARAMS, scheduler='events'), [16, 64, 256]),
+    (SynchHS, Bidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (SynchTimeSlice, Unidirectional_Ring, nothing, PARAMS, [8, 16, 32]),
+    (SynchVariableSpeeds, Unidirectional_Ring, nothing, PARAMS, [8, 16]),
+    (SynchFloodMax, Bidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (SynchFloodMax, Random_Line_Network, nothing, PARAMS, [16, 64, 256]),
+    (SynchFloodMax, Complete_Graph, nothing, PARAMS, [16, 64]),
+    (SynchBFS, Random_Line_Network, leader, PARAMS, [16, 64, 256]),
+    (SynchBFSAck, Random_Line_Network, leader, PARAMS, [16, 64, 256]),
+    (SynchConvergeHeight, Random_Line_Network, bfs_tree, PARAMS, [16, 64, 256]),
+    (AsynchConvergeHeight, Random_Line_Network, bfs_tree_with_children, PARAMS, [16, 64, 256]),
+    (SynchBroadcast, Random_Line_Network, tree_height, Broadcast_Height, [16, 64, 256]),
+    (SynchLubyMIS, Bidirectional_Ring, nothing, PARAMS, [16, 64, 256]),
+    (SynchLubyMIS, Random_Line_Network, nothing, PARAMS, [16, 64, 256]),
+    (SynchBellmanFord, Bidirectional_Line, edge_weights, PARAMS, [8, 16, 32]),
+    (SynchBellmanFord, Random_Line_Network, edge_weights, PARAMS, [8, 16, 32]),
+    (ArrayFloodMax, Bidirectional_Ring, nothing, PARAMS, [256, 4096, 65536]),
+    (ArrayBFS, Bidirectional_Ring, array_leader, PARAMS, [256, 4096, 65536]),
+    (ArrayLubyMIS, Bidirectional_Ring, nothing, PARAMS, [256, 4096, 65536]),
+    (ArrayBellmanFord, Bidirectional_Line, edge_weights, PARAMS, [8, 16, 32, 128]),
+]
+
+# Memory benchmarks
+# Each entry is (Network_, sizes)
+
+MEMORY = [
+    (Bidirectional_Ring, [10000, 100000, 1000000]),
+]
+
+def run_micro(micro, n):
+    """@return: the measurements of microbenchmark micro at size n"""
+    setup, work = micro(n)
+    state = setup()
+    start = clock()
+    ops = work(state)
+    wall_time = clock() - start
+    return {'wall_time': wall_time, 'ops': ops,
+            'ops_per_second': ops/wall_time if wall_time else None}
+
+def run_macro(Algorithm_, Network_, prepare, params, n):
+    """@return: the measurements of running Algorithm_ on a Network_ of size n"""
+    x = Network_(n)
+    prepare(x)
+    A = Algorithm_()
+    start = clock()
+    A(x, params)
+    wall_time = clock() - start
+    return {'wall_time': wall_time, 'messages': A.message_count,
+            'rounds': getattr(A, 'r', None),
+            'messages_per_second': A.message_count/wall_time if wall_time else None}
+
+def run_memory(Network_, n):
+    """@return: the measurements of building a Network_ of size n, and running
+    Do_Nothing on it"""
+    start = clock()
+    x = Network_(n)
+    Do_Nothing(x, dict(PARAMS, snapshots=False))
+    return {'wall_time': clock() - start}
+
+def _measure(sender, run, args):
+    sys.stdout = open(os.devnull, 'w') # Keeps algorithms' output out of the JSON
+    random.seed(0)
+    start_rss = _max_rss()
+    try:
+        result = run(*args)
+    except Exception as e:
+        result = {'error': repr(e)}
+    result['peak_rss'] = _max_rss()
+    result['peak_rss_growth'] = result['peak_rss'] - start_rss
+    sender.send(result)
+
+def _max_rss():
+    """@return: the peak resident set size of this process, in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss*1024
+
+def measure(run, *args, **kwargs):
+    """
+    Runs run(*args) in a new process
+
+    @param timeout: [Optional] keyword argument, the number of seconds after
+    which to kill the process. Defaults to TIMEOUT. None waits forever.
+    @return: its measurements. If the process is killed, or dies, e.g. when it
+    runs out of memory, they are {'error': the reason}
+    """
+    timeout = kwargs.get('timeout', TIMEOUT)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure, args=(sender, run, args))
+    process.daemon = True
+    process.start()
+    sender.close() # So that recv gets EOF if the process dies
+    if receiver.poll(timeout):
+        try:
+            result = receiver.recv()
+        except EOFError: # The process died without a result
+            result = {'error': 'killed'}
+    else:
+        result = {'error': 'timed out after %ss' % timeout}
+    process.terminate()
+    process.join()
+    return result
+
+def benchmarks(quick=False):
+    """@return: a list of (name, kind, n, run, args), for every benchmark"""
+    benchmarks = []
+    for micro, sizes in MICRO:
+        for n in sizes[:1] if quick else sizes:
+            benchmarks.append((micro.__name__[len('micro_'):], 'micro', n, run_micro, (micro, n)))
+    for Algorithm_, Network_, prepare, params, sizes in MACRO:
+        name = Algorithm_.__name__+' on '+Network_.__name__
+        if 'scheduler' in params:
+            name += ' ('+params['scheduler']+')'
+        for n in sizes[:1] if quick else sizes:
+            benchmarks.append((name, 'macro', n, run_macro, (Algorithm_, Network_, prepare, params, n)))
+    for Network_, sizes in MEMORY:
+        for n in sizes[:1] if quick else sizes:
+            benchmarks.append(('memory of '+Network_.__name__, 'memory', n, run_memory, (Network_, n)))
+    return benchmarks
+
+def run_suite(quick=False, keyword=None, out=sys.stdout, timeout=TIMEOUT):
+    """
+    Runs the suite, printing progress to stderr
+
+    @param quick: [Optional] if True, runs every benchmark at its smallest size only
+    @param keyword: [Optional] only runs the benchmarks whose name contains keyword
+    @param out: [Optional] the file to write the JSON results to
+    @param timeout: [Optional] the number of seconds after which to kill a
+    benchmark, and record it as an error
+    @return: the results
+    """
+    results = []
+    for name, kind, n, run, args in benchmarks(quick):
+        if keyword is not None and keyword not in name:
+            continue
+        result = measure(run, *args, timeout=timeout)
+        result.update(name=name, kind=kind, n=n)
+        if kind == 'memory' and 'error' not in result:
+            result['bytes_per_node'] = result['peak_rss_growth']/float(n)
+        results.append(result)
+        print >> sys.stderr, "%-55s n=%-6d %s" % (name, n,
+            result.get('error') or "%.4fs" % result['wall_time'])
+
+    report = {'commit': _commit(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'results': results}
+    json.dump(report, out, indent=1, sort_keys=True)
+    return report
+
+def _commit():
+    """@return: the git commit being benchmarked, or None"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).strip()
+    except Exception:
+        return None
+
+def compare(old, new):
+    """Prints the ratio of the wall time in new to that in old, for every
+    benchmark in both JSON reports, and that of the memory per node, for every
+    memory benchmark"""
+    def key(result):
+        return result['name'], result['n']
+    old_results = {key(result): result for result in old['results']}
+    print "%-55s %-8s %10s %10s %7s" % ('benchmark', 'n', 'old', 'new', 'ratio')
+    for result in new['results']:
+        if key(result) not in old_results or 'error' in result:
+            continue
+        before, after = old_results[key(result)].get('wall_time'), result['wall_time']
+        if before:
+            print "%-55s %-8d %9.4fs %9.4fs %6.2fx" % (result['name'], result['n'],
+                before, after, after/before)
+
+    print
+    print "%-55s %-8s %10s %10s %7s" % ('bytes per node', 'n', 'old', 'new', 'ratio')
+    for result in new['results']:
+        if key(result) not in old_results or 'bytes_per_node' not in result:
+            continue
+        before, after = old_results[key(result)].get('bytes_per_node'), result['bytes_per_node']
+        if before:
+            print "%-55s %-8d %10.0f %10.0f %6.2fx" % (result['name'], result['n'],
+                before, after, after/before)
+
+def main():
+    parser = argparse.ArgumentParser(description="DATK performance benchmark suite")
+    parser.add_argument('-o', '--output', help="the JSON file to write results to. Defaults to stdout")
+    parser.add_argument('--quick', action='store_true', help="run every benchmark at its smallest size only")
+    parser.add_argument('-k', '--keyword', help="only run the benchmarks whose name contains KEYWORD")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help="kill a benchmark after TIMEOUT seconds (default %(default)s)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two JSON results")
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = [json.load(open(path)) for path in args.compare]
+        compare(old, new)
+    elif args.output:
+        with open(args.output, 'w') as out:
+            run_suite(args.quick, args.keyword, out, args.timeout)
+    else:
+        run_suite(args.quick, args.keyword, timeout=args.timeout)
+
+if __name__ == '__main__':
+    main()
@@ -32,11 +32,33 @@ def test_ASYNC_LCR_BI_RING():
     AsyncLCR(r)
     assertLeaderElection(r)
 
+def test_ASYNC_LCR_EVENTS():
+    n = 8
+    r = Unidirectional_Ring(n)
+    A = AsyncLCR(r, params={'scheduler': 'events', 'delay': 1})
+    assertLeaderElection(r)
+    assert A.time == 2*n-1
+
+    for delay in ['normalized', ('uniform', 1, 3), 'exponential', lambda p, q: 1 + (p.UID+q.UID)%2]:
+        r = Bidirectional_Ring(n)
+        AsyncLCR(r, params={'scheduler': 'events', 'delay': delay})
+        assertLeaderElection(r)
+
 def test_HS_BI_RING():
     r = Bidirectional_Ring(6)
     SynchHS(r)
     assertLeaderElection(r)
 
+def test_HS_UNNAMED_PORTS():
+    x = Network.from_edges(4, [(0, 1), (1, 2), (2, 3), (3, 0)], bidirectional=True)
+    try:
+        SynchHS(x)
+    except Exception as e:
+        assert "'left' and 'right'" in str(e)
+    else:
+        assert False, "SynchHS must reject a Network without named ports"
+    assert all('status' not in p.state for p in x)
+
 def test_TS_UNI_RING():
     r = Unidirectional_Ring(6)
     SynchTimeSlice(r)
@@ -207,6 +229,73 @@ def test_send_receive_msgs():
     assert x[1].get_msgs(A) == [a3]
     assert x[1].get_msgs(A) == []
 
+def test_mailboxes():
+    A = LCR()
+    B = LCR()
+    x = Bidirectional_Ring(4, lambda p:p)
+    x[0].send_msg(Message(A))
+    x[0].send_msg(Message(B))
+    assert x[1].has_msgs(A) and x[1].has_msgs(B)
+    assert len(x[1].get_msgs(A, x[2])) == 0
+    assert len(x[1].get_msgs(A)) == 1
+    assert not x[1].has_msgs(A)
+    x[1].clear_msgs(B)
+    assert not x[1].has_msgs(B)
+    assert x[1].in_channel == {}
+
+def test_combiners():
+    x = Complete_Graph(5, lambda t:t)
+    A, B = SynchFloodMax(), SynchBFS()
+    for p in x[1:]:
+        p.send_msg(Message(A, p.UID), x[0])
+        p.send_msg(Message(B, p.UID), x[0])
+    assert A.message_count == 4
+    assert len(x[0].in_channel[A]) == 1
+    assert [m.content for m in x[0].get_msgs(A)] == [4]
+    first = x[0].in_nbrs[0]
+    assert [m.content for m in x[0].get_msgs(B)] == [first.UID]
+
+    class Sum(Synchronous_Algorithm):
+        def combiner(self, a, b):
+            return Message(self, a.content + b.content)
+    C = Sum()
+    for p in x[1:]:
+        p.send_msg(Message(C, p.UID), x[0])
+    assert [m.content for m in x[0].get_msgs(C)] == [10]
+
+def test_ports():
+    x = Bidirectional_Ring(4, lambda p:p)
+    for i, p in enumerate(x):
+        assert p.nbr('right') == x[(i+1)%4]
+        assert p.nbr('left') == x[(i-1)%4]
+        for port, nbr in enumerate(p.out_nbrs):
+            assert p.out_ports[nbr] == port
+            assert nbr.in_nbrs[p.remote_ports[port]] == p
+        for port, nbr in enumerate(p.in_nbrs):
+            assert p.in_ports[nbr] == port
+
+    A = LCR()
+    a1 = Message(A)
+    x[0].send_msg(a1, 'left')
+    assert x[3].get_msgs(A) == [a1]
+    assert x[1].get_msgs(A) == []
+
+def test_compact_processes():
+    x = Unidirectional_Ring(3, lambda p:p)
+    A = LCR()
+    for obj in [x[0], Message(A), SynchBFSAck.Search(A), SynchHS.Leader_Declaration(A)]:
+        assert not hasattr(obj, '__dict__')
+
+    p, q = x[0], Process(5)
+    assert p.in_channel is q.in_channel and p.algs is q.algs
+    x[2].send_msg(Message(A, 1))
+    assert x[0].in_channel is not q.in_channel and q.in_channel == {}
+    assert [m.content for m in x[0].get_msgs(A)] == [1]
+    p.name_port('next', x[1])
+    assert q.port_names == {}
+    x.add(A)
+    assert A in p.algs and q.algs == frozenset()
+
 def test_network_snapshots():
     x = Unidirectional_Ring(5)
 
@@ -222,6 +311,131 @@ def test_network_snapshots():
     x.restore_snapshot(0)
     assert snapshots_before_restore == x._snapshots, "restore_snapshots modified self.snapshots"
 
+def test_snapshot_journal():
+    x = Unidirectional_Ring(10)
+    x._snapshots.keyframe_interval = 4
+    history = [x.get_snapshot()]
+    class Recording_LCR(LCR):
+        def round(self):
+            LCR.round(self)
+            history.append(x.get_snapshot())
+    Recording_LCR(x)
+    history.append(x.get_snapshot())
+
+    def public(states):
+        return [{k: v for k, v in state.items() if isinstance(k, str)} for state in states]
+
+    assert x.count_snapshots() == len(history)
+    final = x.state()
+    for t in [5, 0, len(history)-1, 3, 4, 9]:
+        assert public([p.state for p in x.view(t)]) == public(history[t])
+        assert [p.state for p in x.view(t)] == x._snapshots[t]
+    assert x.state() == final, "Viewing a snapshot modified live state"
+
+    for t in [6, 2]:
+        x.restore_snapshot(t)
+        assert public([p.state for p in x]) == public(history[t])
+
+def test_snapshot_arrays():
+    class Vector(Synchronous_Algorithm):
+        def trans_i(self, p, msgs):
+            p.state['vec'] = np.arange(3) + self.r
+            if self.r == 3:
+                p.terminate(self)
+    x = Bidirectional_Ring(4)
+    Vector(x)
+    assert (x.view(-1)[0].state['vec'] == np.arange(3) + 3).all()
+    assert (x.view(1)[0].state['vec'] == np.arange(3) + 1).all()
+
+def test_snapshot_policies():
+    def count_snapshots(policy):
+        x = Unidirectional_Ring(6)
+        A = LCR(x, params={'snapshots': policy, 'verbosity': Algorithm.SILENT})
+        assertLeaderElection(x)
+        return x, A.r, x.count_snapshots()
+
+    x, r, count = count_snapshots(True)
+    assert count == r+2
+    x, r, count = count_snapshots(False)
+    assert count == 1
+    x, r, count = count_snapshots('final')
+    assert count == 2
+    x, r, count = count_snapshots(4)
+    assert count == 1 + r//4 + 1
+
+    x, r, count = count_snapshots({'every': 2, 'keys': ['status']})
+    assert count == 1 + r//2 + 1
+    for t in range(count-1):
+        for p in x.view(t):
+            assert set(p.state) <= set(['n', 'status'])
+    assertLeaderElection(x.view(-1))
+
+def test_active_set():
+    calls = {'msgs_i': 0, 'halt_i': 0}
+    class Countdown(Synchronous_Algorithm):
+        def msgs_i(self, p):
+            calls['msgs_i'] += 1
+        def trans_i(self, p, msgs):
+            if self.r >= p.UID:
+                p.terminate(self)
+        def halt_i(self, p):
+            calls['halt_i'] += 1
+            return Synchronous_Algorithm.halt_i(self, p)
+
+    n = 20
+    x = Bidirectional_Line(n, lambda t:t)
+    A = Countdown(x)
+    assert A.r == n-1
+    assert A.active == [] and A.halted_count() == n
+    assert calls['msgs_i'] == 1 + sum(range(n))
+    assert calls['halt_i'] <= 3*calls['msgs_i'] + n, "Halted Processes are still visited"
+
+def test_random_set():
+    from datk.core.helpers import Random_Set
+    s = Random_Set(range(5))
+    s.remove(1)
+    s.discard(1)
+    s.add(3)
+    s.add(7)
+    assert sorted(s) == [0, 2, 3, 4, 7]
+    assert sorted(s[i] for i in range(len(s))) == [0, 2, 3, 4, 7]
+    assert 2 in s and 1 not in s
+    assert s.choice() in s
+
+def test_ASYNC_LCR_LARGE_RING():
+    r = Unidirectional_Ring(500)
+    AsyncLCR(r)
+    assertLeaderElection(r)
+
+def test_ASYNC_SEND_DURING_TRANS():
+    class Async_Flood(Asynchronous_Algorithm):
+        def msgs_i(self, p):
+            if p.UID == 0 and not self.has(p, 'sent'):
+                self.set(p, 'sent', True)
+                p.output('flooded', True, False)
+                p.send_msg(Message(self))
+                p.terminate(self)
+        def trans_i(self, p, msgs):
+            if msgs and 'flooded' not in p.state:
+                p.output('flooded', True, False)
+                p.send_msg(Message(self))
+                p.terminate(self)
+
+    x = Random_Line_Network(20)
+    A = Async_Flood(x)
+    assertBroadcast(x, 'flooded')
+    assert A.message_count == sum(len(p.out_nbrs) for p in x)
+
+def test_ASYNC_SEND_OUTSIDE_EXECUTION():
+    x = Bidirectional_Ring(3, lambda p:p)
+    A = AsyncLCR()
+    x[0].send_msg(Message(A, 1))
+    assert [m.content for m in x[1].get_msgs(A)] == [1]
+
+    AsyncLCR(x)
+    x[0].send_msg(Message(A, 2))
+    assert [m.content for m in x[1].get_msgs(A)] == [2]
+
 def test_network_adjacency():
     n = Random_Line_Network(10)
     A_n = n.adjacency_matrix()
@@ -230,6 +444,83 @@ def test_network_adjacency():
             assert A_n[i][j] == (n[j] in n[i].out_nbrs + n[i].in_nbrs), "Incorrect Adjacency matrix"
             assert A_n[i][j] == n.adjacent(i, j), "Network.adjacent failed"
 
+def test_network_topology_cache():
+    x = Bidirectional_Line(6)
+    L = x._laplacian()
+    assert (L == np.diag(x.degrees()) - x.adjacency_matrix()).all()
+    assert (x._laplacian(sparse=True).toarray() == L).all()
+    assert x.adjacency_matrix() is x.adjacency_matrix()
+    layout = x.get_vertex_coords()
+    assert layout.shape == (6, 2)
+    assert x.get_vertex_coords('spectral') is layout
+
+    x[0].bi_link(x[-1])
+    assert x.get_vertex_coords() is not layout
+    assert x.adjacency_matrix()[0][-1] == 1
+    assert x._laplacian()[0][0] == 2
+    assert all(d == 2 for d in x.degrees())
+
+def test_bulk_construction():
+    def links(x):
+        return [([x.index(q) for q in p.out_nbrs], [x.index(q) for q in p.in_nbrs],
+                 p.remote_ports) for p in x]
+    edges = [(0, 1), (1, 2), (0, 1), (3, 3), (2, 0), (4, 1)]
+    x, y = Network(5, lambda i:i), Network(5, lambda i:i)
+    x[4].link_to(x[0])
+    y[4].link_to(y[0])
+    for i, j in edges:
+        x[i].link_to(x[j])
+    y.link_edges(edges)
+    assert links(x) == links(y)
+    assert (x.csr() != y.csr()).nnz == 0
+
+    z = Network.from_edges(5, edges, lambda i:i)
+    C = z.csr()
+    assert list(C.indices) == [1, 2, 0, 3, 1]
+    assert links(Network.from_scipy_sparse(C, lambda i:i)) == links(z)
+
+    z = Bidirectional_Ring(4, lambda i:i)
+    z[0].name_port('next', z[1])
+    assert z[0].nbr('next') == z[1] and 'next' not in z[1].port_names
+    assert z[1].nbr('left') == z[0]
+
+    z = Complete_Graph(6)
+    for p in z:
+        assert len(p.out_nbrs) == len(p.in_nbrs) == 5
+    z.version += 1 # Recomputes the topology that Complete_Graph cached
+    assert (z.csr() != Complete_Graph(6).csr()).nnz == 0
+
+    try:
+        import networkx
+    except ImportError:
+        return
+    z = Network.from_networkx(networkx.path_graph(4))
+    assert links(z) == links(Bidirectional_Line(4))
+
+def test_spectral_layout():
+    import datk.core.distalgs as distalgs
+    x = Random_Line_Network(60)
+    dense = np.array(x.get_vertex_coords('spectral'))
+    dense_layout_max, eigsh = Network.DENSE_LAYOUT_MAX, distalgs.eigsh
+    calls = []
+    def counted_eigsh(*args, **kwargs):
+        calls.append(args)
+        return eigsh(*args, **kwargs)
+    try:
+        Network.DENSE_LAYOUT_MAX = 10
+        distalgs.eigsh = counted_eigsh
+        x.version += 1 # Invalidates the cached dense layout
+        sparse = np.array(x.get_vertex_coords('spectral'))
+    finally:
+        Network.DENSE_LAYOUT_MAX, distalgs.eigsh = dense_layout_max, eigsh
+    assert len(calls) == 1, "The sparse solver did not run"
+    assert np.allclose(abs(dense), abs(sparse))
+
+    y = Network(6)
+    for i in range(4):
+        y[i].bi_link(y[i+1])
+    assert (y.get_vertex_coords('spectral') == y.get_vertex_coords('circular')).all()
+
 def test_network_degrees():
     for d in Unidirectional_Ring(10).degrees():
         assert d == 2
@@ -308,3 +599,111 @@ def test_SYNCH_LUBY_MIS():
     x = Random_Line_Network(10)
     SynchLubyMIS(x)
     assertLubyMIS(x)
+
+def test_color_cache():
+    from datk.core.colorizer import Color_Cache
+    x = Bidirectional_Ring(8)
+    SynchHS(x)
+    colors = Color_Cache(x, capacity=5, radius=2)
+    try:
+        assert colors.get(3) == x.get_colors(3)
+        assert colors.wait(5)
+        assert len(colors) == 5 and all(t in colors for t in range(1, 6))
+        colors.get(7)
+        assert colors.wait(5)
+        assert len(colors) <= 5 and all(t in colors for t in range(5, min(10, len(x._snapshots))))
+    finally:
+        colors.close()
+
+def test_array_algorithms():
+    def run(Algorithm_, x, key, seed=0):
+        random.seed(seed)
+        for p in x:
+            p.state.pop(key, None)
+        A = Algorithm_(x)
+        return A.r, A.message_count, [p.state.get(key) for p in x]
+
+    for x in [Bidirectional_Ring(12), Unidirectional_Ring(9), Random_Line_Network(15)]:
+        assert run(SynchFloodMax, x, 'status') == run(ArrayFloodMax, x, 'status')
+        assertLeaderElection(x)
+        assert run(SynchBFS, x, 'parent') == run(ArrayBFS, x, 'parent')
+        assertBFS(x)
+
+    x = Random_Line_Network(15)
+    for seed in range(3):
+        assert run(SynchLubyMIS, x, 'MIS', seed) == run(ArrayLubyMIS, x, 'MIS', seed)
+        assertLubyMIS(x)
+
+    x = Bidirectional_Line(8, lambda t:t)
+    for p in x:
+        p.state['nbr_dist'] = {q.UID: p.UID+q.UID for q in p.out_nbrs}
+    assert run(SynchBellmanFord, x, 'SP') == run(ArrayBellmanFord, x, 'SP')
+    assert x[0].state['SP'][7] == sum(range(1, 8)) + sum(range(0, 7))
+
+def test_array_BFS_unreachable():
+    x = Network(3, lambda t:t)
+    x[0].bi_link(x[1])
+    x[0].state['status'] = 'leader'
+    try:
+        ArrayBFS(x)
+        assert False, "ArrayBFS halted without reaching every Process"
+    except Exception as e:
+        assert 'reach' in str(e)
+
+def test_column_store():
+    class Count(Synchronous_Algorithm):
+        fields = {'count': int, 'seen': object}
+        def msgs_i(self, p):
+            if not self.has(p, 'count'):
+                self.set(p, 'count', 0)
+                self.set(p, 'seen', [])
+            p.send_msg(Message(self, p.UID))
+        def trans_i(self, p, msgs):
+            self.increment(p, 'count')
+            self.increment(p, 'seen', [m.content for m in msgs])
+            self.delete(p, 'missing')
+            if self.r == 3:
+                counts = self.network.column('count', self)
+                assert counts.dtype == int and list(counts[:self.network.index(p)]) == [3]*self.network.index(p)
+                self.output(p, 'seen', self.get(p, 'seen'))
+                p.terminate(self)
+
+    x = Bidirectional_Ring(6, lambda t:t)
+    A = Count(x)
+    assert A.r == 3
+    assert not A._columns and A not in x.store.columns
+    for p in x:
+        assert A not in p.state
+        assert sorted(p.state['seen']) == sorted([p.nbr('left').UID, p.nbr('right').UID]*3)
+
+    SynchFloodMax(x)
+    status = x.column('status')
+    assert (status == 'leader').sum() == 1 and (status == 'non-leader').sum() == 5
+    assert list(x.view(0).column('status')) == [None]*6
+    assert list(x.column('missing')) == [None]*6
+
+def test_column_increment_unset():
+    x = Unidirectional_Ring(3)
+    A = Do_Nothing()
+    A.fields = {'count': int, 'items': object}
+    x.store.add(A)
+    p = x[0]
+    for field, inc in [('count', 2), ('items', [1])]:
+        A.increment(p, field, inc)
+        A.increment(p, field, inc)
+        assert A.has(p, field) and A.get(p, field) == inc+inc
+        A.delete(p, field)
+        A.increment(p, field, inc)
+        assert A.has(p, field) and A.get(p, field) == inc
+    assert list(A._columns['count'].read()) == [2, None, None]
+    x.store.remove(A)
+
+def test_compose_cleanup_columns():
+    x = Unidirectional_Ring(5)
+    inner = Compose(LCR(), LCR())
+    C = Compose(inner, LCR())
+    C(x)
+    assertLeaderElection(x)
+    assert not x.store.columns
+    for A in [inner.A, inner.B, C.B]:
+        assert not A._columns